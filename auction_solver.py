@@ -0,0 +1,230 @@
+'''
+Offline CFR+ solver for the Sneak Peek auction subgame.
+
+The abstraction: each player only knows the bucket of their flop hand (quantiles of the eval7
+value of hole cards + flop) and picks a bid as a fraction of the pot. Payments and reveals
+come from the engine's GameState rules. After the auction the pot goes to the better hand at
+showdown, and the player who saw an opponent card gains REVEAL_VALUE of the final pot.
+Every pot size is an independent subgame and is solved in its own worker process.
+
+Usage: python auction_solver.py --out auction.strat --workers 4
+'''
+import argparse
+import json
+import os
+import random
+import time
+from multiprocessing import Pool
+import eval7
+import numpy as np
+
+from engine import GameState, ActionBid, STARTING_STACK
+from pkbot.auction import write_strategy
+
+POTS = [40, 80, 160, 320, 640, 1280, 2560, 5000]
+BID_FRACTIONS = [0., 0.1, 0.25, 0.5, 0.75, 1., 1.5, 2.]
+NUM_BUCKETS = 10
+REVEAL_VALUE = 0.1
+
+
+def sample_values(seed, num_samples):
+    '''
+    Deals random flops and returns the eval7 hand values of one hand per deal.
+    '''
+    rng = random.Random(seed)
+    deck = eval7.Deck()
+    values = np.empty(num_samples, dtype=np.int64)
+    for i in range(num_samples):
+        cards = rng.sample(deck.cards, 5)
+        values[i] = eval7.evaluate(cards)
+    return values
+
+
+def sample_showdowns(seed, num_samples, bucket_edges):
+    '''
+    Deals random heads-up hands to the river and returns (deals, wins) arrays indexed by the
+    flop buckets of both players, where wins counts ties as half a win for player 0.
+    '''
+    rng = random.Random(seed)
+    deck = eval7.Deck()
+    num_buckets = len(bucket_edges) + 1
+    deals = np.zeros((num_buckets, num_buckets))
+    wins = np.zeros((num_buckets, num_buckets))
+    for _ in range(num_samples):
+        cards = rng.sample(deck.cards, 9)
+        hand0, hand1, flop, runout = cards[:2], cards[2:4], cards[4:7], cards[7:]
+        b0 = np.searchsorted(bucket_edges, eval7.evaluate(hand0 + flop), side='right')
+        b1 = np.searchsorted(bucket_edges, eval7.evaluate(hand1 + flop), side='right')
+        score0 = eval7.evaluate(hand0 + flop + runout)
+        score1 = eval7.evaluate(hand1 + flop + runout)
+        deals[b0, b1] += 1
+        wins[b0, b1] += 1. if score0 > score1 else 0.5 if score0 == score1 else 0.
+    return deals, wins
+
+
+def auction_outcome(pot, bid0, bid1):
+    '''
+    Plays both bids through the engine's GameState and returns (paid, revealed): the chips each
+    player added and whether each player was shown an opponent card.
+    '''
+    deck = eval7.Deck()
+    hands = [deck.deal(2), deck.deal(2)]
+    chips = [STARTING_STACK - pot // 2] * 2
+    # the flop auction starts with the big blind (dealer 1) to act
+    state = GameState(1, 3, True, [None, None], [0, 0], chips, hands, [[], []], deck, None)
+    state = state.apply_action(ActionBid(bid1))
+    state = state.apply_action(ActionBid(bid0))
+    paid = [chips[i] - state.chips[i] for i in range(2)]
+    revealed = [len(state.opp_hands[i]) > 0 for i in range(2)]
+    return paid, revealed
+
+
+def build_utilities(pot, bid_fractions, equity, reveal_value):
+    '''
+    Returns player 0's payoff U[b0, a0, b1, a1] for a pot size; player 1 gets -U.
+    '''
+    max_bid = STARTING_STACK - pot // 2
+    amounts = [min(int(fraction * pot), max_bid) for fraction in bid_fractions]
+    num_bids = len(amounts)
+    final_pot = np.empty((num_bids, num_bids))
+    paid0 = np.empty((num_bids, num_bids))
+    edge = np.empty((num_bids, num_bids))
+    for a0, bid0 in enumerate(amounts):
+        for a1, bid1 in enumerate(amounts):
+            paid, revealed = auction_outcome(pot, bid0, bid1)
+            final_pot[a0, a1] = pot + paid[0] + paid[1]
+            paid0[a0, a1] = pot // 2 + paid[0]
+            edge[a0, a1] = int(revealed[0]) - int(revealed[1])
+    # EV0 = final_pot * equity - paid0 + reveal_value * final_pot * edge
+    return (equity[:, None, :, None] * final_pot[None, :, None, :]
+            - paid0[None, :, None, :]
+            + reveal_value * (final_pot * edge)[None, :, None, :])
+
+
+def regret_matching(regrets):
+    '''
+    Converts clipped regrets into a strategy, uniform where all regrets are zero.
+    '''
+    total = regrets.sum(axis=1, keepdims=True)
+    uniform = np.full_like(regrets, 1. / regrets.shape[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total > 0, regrets / total, uniform)
+
+
+def exploitability(utilities, joint, strategies):
+    '''
+    Returns the mean best-response gain, in chips per auction, against the given strategies.
+    '''
+    values0 = np.einsum('xayb,xy,yb->xa', utilities, joint, strategies[1])
+    values1 = np.einsum('xayb,xy,xa->yb', -utilities, joint, strategies[0])
+    # the game is zero-sum, so the two best-response values sum to zero at equilibrium
+    return (values0.max(axis=1).sum() + values1.max(axis=1).sum()) / 2
+
+
+def load_checkpoint(path, params):
+    '''
+    Returns the arrays saved at path, or None if there are none or they were made with other
+    parameters than params.
+    '''
+    if not os.path.exists(path):
+        return None
+    saved = np.load(path)
+    if 'params' not in saved or str(saved['params']) != json.dumps(params, sort_keys=True):
+        print('Discarding {}, it was made with different parameters'.format(path))
+        return None
+    return saved
+
+
+def solve_pot(job):
+    '''
+    Runs CFR+ with linear averaging on one pot size, checkpointing as it goes, and returns the
+    symmetrised average strategy of shape (num_buckets, num_bids).
+    '''
+    pot, bid_fractions, equity, joint, reveal_value, iterations, checkpoint_every, checkpoint_dir, params = job
+    utilities = build_utilities(pot, bid_fractions, equity, reveal_value)
+    num_buckets, num_bids = equity.shape[0], len(bid_fractions)
+    regrets = np.zeros((2, num_buckets, num_bids))
+    strategy_sums = np.zeros((2, num_buckets, num_bids))
+    start = 0
+    params = dict(params, pot=pot)
+    checkpoint_path = os.path.join(checkpoint_dir, 'pot_{}.npz'.format(pot)) if checkpoint_dir else None
+    saved = load_checkpoint(checkpoint_path, params) if checkpoint_path else None
+    # a checkpoint past the requested iterations would be labeled with the wrong count
+    if saved is not None and int(saved['iteration']) <= iterations:
+        regrets, strategy_sums, start = saved['regrets'], saved['strategy_sums'], int(saved['iteration'])
+
+    for t in range(start + 1, iterations + 1):
+        # alternating updates: player 0 against player 1's current strategy, then the reverse
+        strategy1 = regret_matching(regrets[1])
+        values = np.einsum('xayb,xy,yb->xa', utilities, joint, strategy1)
+        strategy0 = regret_matching(regrets[0])
+        regrets[0] = np.maximum(regrets[0] + values - (values * strategy0).sum(axis=1, keepdims=True), 0.)
+        # the average is over the strategies played, taken before their regret update
+        strategy_sums[0] += t * strategy0
+        strategy0 = regret_matching(regrets[0])
+
+        values = np.einsum('xayb,xy,xa->yb', -utilities, joint, strategy0)
+        regrets[1] = np.maximum(regrets[1] + values - (values * strategy1).sum(axis=1, keepdims=True), 0.)
+        strategy_sums[1] += t * strategy1
+
+        if checkpoint_path and (t % checkpoint_every == 0 or t == iterations):
+            tmp_path = checkpoint_path + '.tmp.npz'
+            np.savez(tmp_path, regrets=regrets, strategy_sums=strategy_sums, iteration=t,
+                     params=json.dumps(params, sort_keys=True))
+            os.replace(tmp_path, checkpoint_path)
+
+    averages = strategy_sums / strategy_sums.sum(axis=2, keepdims=True)
+    print('pot {:5d}: exploitability {:.3f} chips'.format(pot, exploitability(utilities, joint, averages)))
+    return averages.mean(axis=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve the auction subgame offline.')
+    parser.add_argument('--out', type=str, default='auction.strat', help='Strategy file to write')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--samples', type=int, default=400000, help='Deals sampled for bucket equities')
+    parser.add_argument('--iterations', type=int, default=20000, help='CFR+ iterations per pot size')
+    parser.add_argument('--checkpoint-dir', type=str, default='auction_checkpoints', help='Where to keep checkpoints')
+    parser.add_argument('--checkpoint-every', type=int, default=1000, help='Iterations between checkpoints')
+    parser.add_argument('--reveal-value', type=float, default=REVEAL_VALUE, help='Fraction of the pot a revealed card is worth')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the sampled deals')
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    tables_path = os.path.join(args.checkpoint_dir, 'tables.npz')
+    chunk = -(-args.samples // args.workers)
+    # the sampled tables depend on how the samples are split over the workers
+    params = {'samples': args.samples, 'seed': args.seed, 'workers': args.workers, 'num_buckets': NUM_BUCKETS}
+    with Pool(args.workers) as pool:
+        tables = load_checkpoint(tables_path, params)
+        if tables is not None:
+            bucket_edges, deals, wins = tables['bucket_edges'], tables['deals'], tables['wins']
+        else:
+            print('Sampling hand buckets...')
+            seeds = ['{}-{}'.format(args.seed, i) for i in range(args.workers)]
+            values = np.concatenate(pool.starmap(sample_values, [(seed, chunk) for seed in seeds]))
+            bucket_edges = np.quantile(values, np.arange(1, NUM_BUCKETS) / NUM_BUCKETS).astype(np.int64)
+            print('Sampling bucket equities...')
+            results = pool.starmap(sample_showdowns, [(seed + '-showdown', chunk, bucket_edges) for seed in seeds])
+            deals = sum(result[0] for result in results)
+            wins = sum(result[1] for result in results)
+            np.savez(tables_path, bucket_edges=bucket_edges, deals=deals, wins=wins,
+                     params=json.dumps(params, sort_keys=True))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            equity = np.where(deals > 0, wins / deals, 0.5)
+        joint = deals / deals.sum()
+
+        print('Solving {} pot sizes...'.format(len(POTS)))
+        jobs = [(pot, BID_FRACTIONS, equity, joint, args.reveal_value, args.iterations,
+                 args.checkpoint_every, args.checkpoint_dir,
+                 dict(params, bid_fractions=BID_FRACTIONS, reveal_value=args.reveal_value)) for pot in POTS]
+        strategy = np.stack(pool.map(solve_pot, jobs))
+
+    write_strategy(args.out, strategy, POTS, BID_FRACTIONS, bucket_edges,
+                   reveal_value=args.reveal_value, iterations=args.iterations, samples=args.samples)
+    print('Wrote {} in {:.1f}s'.format(args.out, time.perf_counter() - start_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,451 @@
+'''
+Distributed tournament runner: a coordinator hands out pairings to worker processes over TCP.
+
+Workers may run on any host that sees the bot files at the same paths (e.g. a shared
+filesystem). Each worker plays one match at a time with PokerMatch, heartbeats while it plays
+and streams the results and logs back. Matches held by a worker that disconnects or stops
+heartbeating are put back on the queue.
+
+Coordinator: python cluster.py coordinator --bot A=./bot_a.py --bot B=./bot_b.py --games 4
+Worker:      python cluster.py worker --host <coordinator host>
+Both on one machine: python cluster.py coordinator ... --local-workers 3
+'''
+import argparse
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import deque
+from itertools import combinations
+
+from config import *
+from engine import add_limit_args, limit_argv, parse_limit_args
+
+DEFAULT_PORT = 5055
+HEARTBEAT_INTERVAL = 2.0
+HEARTBEAT_TIMEOUT = 15.0
+CHECKPOINT_NAME = 'checkpoint.json'
+MAX_ATTEMPTS = 3
+
+
+def send_message(sockfile, message, lock=None):
+    '''
+    Writes one JSON message per line.
+    '''
+    data = json.dumps(message) + '\n'
+    if lock is None:
+        sockfile.write(data)
+        sockfile.flush()
+        return
+    with lock:
+        sockfile.write(data)
+        sockfile.flush()
+
+
+def make_pairings(bots, games):
+    '''
+    Returns a round-robin schedule playing every pair of bots games times, alternating seats.
+    '''
+    matches = []
+    for (name_a, file_a), (name_b, file_b) in combinations(bots, 2):
+        for game in range(games):
+            seats = [(name_a, file_a), (name_b, file_b)]
+            if game % 2:
+                seats.reverse()
+            matches.append({'match_id': len(matches), 'bots': seats})
+    return matches
+
+
+# Coordinator ----------------------------------------------------------------------------------------
+class Coordinator():
+    '''
+    Holds the queue of pending matches and tracks which worker is playing which match.
+    '''
+
+    def __init__(self, matches, out_folder, heartbeat_timeout=HEARTBEAT_TIMEOUT, results=None, max_attempts=MAX_ATTEMPTS):
+        self.out_folder = out_folder
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.attempts = {}  # match_id -> failed attempts
+        self.failed = {}  # match_id -> error of the last attempt, for matches that failed max_attempts times
+        self.matches = matches
+        self.num_matches = len(matches)
+        # results of a resumed tournament are kept and their matches are not played again
+        self.results = dict(results or {})
+        self.pending = deque(match for match in matches if match['match_id'] not in self.results)
+        self.running = {}  # match_id -> (worker, match, last_heartbeat)
+        self.workers = {}  # worker -> last message time
+        self.lock = threading.Lock()
+        self.checkpoint_lock = threading.Lock()
+        self.finished = threading.Event()
+        if len(self.results) == self.num_matches:
+            self.finished.set()
+        self.start_time = time.monotonic()
+
+    def next_match(self, worker):
+        '''
+        Assigns the next pending match to a worker, or returns None.
+        '''
+        with self.lock:
+            # a re-queued match may have been finished by the worker that was presumed lost
+            while self.pending and self.pending[0]['match_id'] in self.results:
+                self.pending.popleft()
+            if not self.pending:
+                return None
+            match = self.pending.popleft()
+            self.running[match['match_id']] = (worker, match, time.monotonic())
+            return match
+
+    def heartbeat(self, worker):
+        '''
+        Refreshes the liveness of a worker and every match it holds.
+        '''
+        now = time.monotonic()
+        with self.lock:
+            self.workers[worker] = now
+            for match_id, (owner, match, _) in list(self.running.items()):
+                if owner == worker:
+                    self.running[match_id] = (owner, match, now)
+
+    def requeue(self, worker, reason):
+        '''
+        Puts every match held by a worker back at the front of the queue.
+        '''
+        with self.lock:
+            for match_id, (owner, match, _) in list(self.running.items()):
+                if owner == worker:
+                    del self.running[match_id]
+                    self.pending.appendleft(match)
+                    print('Re-queued match {} from {} ({})'.format(match_id, worker, reason))
+
+    def complete(self, worker, match_id, result, logs):
+        '''
+        Records a finished match and writes its logs; duplicate results are ignored.
+        '''
+        with self.lock:
+            self.running.pop(match_id, None)
+            if match_id in self.results:
+                return
+            self.results[match_id] = dict(result, worker=worker)
+            done = len(self.results) + len(self.failed)
+        match_folder = os.path.join(self.out_folder, 'match_{:04d}'.format(match_id))
+        os.makedirs(match_folder, exist_ok=True)
+        for name, text in logs.items():
+            with open(os.path.join(match_folder, os.path.basename(name)), 'w') as log_file:
+                log_file.write(text)
+        self.write_checkpoint()
+        bots = result['bots']
+        print('[{}/{}] match {} on {}: {} {:+d}, {} {:+d}'.format(
+            done, self.num_matches, match_id, worker,
+            bots[0]['name'], bots[0]['bankroll'], bots[1]['name'], bots[1]['bankroll']))
+        if done == self.num_matches:
+            self.finished.set()
+
+    def fail(self, worker, match_id, error):
+        '''
+        Re-queues a match that raised on a worker, or gives up on it after max_attempts failures.
+        '''
+        with self.lock:
+            entry = self.running.pop(match_id, None)
+            if entry is None or match_id in self.results:
+                return
+            self.attempts[match_id] = self.attempts.get(match_id, 0) + 1
+            if self.attempts[match_id] < self.max_attempts:
+                self.pending.appendleft(entry[1])
+                print('Re-queued match {} from {} (failed {} of {} times)'.format(
+                    match_id, worker, self.attempts[match_id], self.max_attempts))
+                return
+            self.failed[match_id] = error
+            done = len(self.results) + len(self.failed)
+        print('[{}/{}] match {} failed {} times, giving up'.format(done, self.num_matches, match_id, self.max_attempts))
+        if done == self.num_matches:
+            self.finished.set()
+
+    def write_checkpoint(self):
+        '''
+        Saves the schedule and every result so far, for run_coordinator --resume.
+        '''
+        with self.checkpoint_lock:
+            with self.lock:
+                results = dict(self.results)
+            path = os.path.join(self.out_folder, CHECKPOINT_NAME)
+            # write next to the checkpoint and rename, so a crash never leaves a partial file
+            with open(path + '.tmp', 'w') as checkpoint_file:
+                json.dump({'matches': self.matches, 'results': results}, checkpoint_file)
+            os.replace(path + '.tmp', path)
+
+    def monitor(self):
+        '''
+        Re-queues matches whose worker has stopped heartbeating.
+        '''
+        while not self.finished.wait(1.0):
+            now = time.monotonic()
+            with self.lock:
+                stale = {owner for owner, _, seen in self.running.values() if now - seen > self.heartbeat_timeout}
+            for worker in stale:
+                self.requeue(worker, 'heartbeat timeout')
+
+    def collect_metrics(self):
+        '''
+        Returns the live tournament metrics for metrics.MetricsServer.
+        '''
+        now = time.monotonic()
+        with self.lock:
+            num_pending, num_running, num_done = len(self.pending), len(self.running), len(self.results)
+            num_failed = len(self.failed)
+            workers = dict(self.workers)
+            standings = self.standings()
+        elapsed = now - self.start_time
+        return [
+            ('pokerbots_matches', 'gauge', 'Matches by state',
+             [({'state': 'pending'}, num_pending), ({'state': 'running'}, num_running), ({'state': 'done'}, num_done),
+              ({'state': 'failed'}, num_failed)]),
+            ('pokerbots_matches_per_second', 'gauge', 'Matches finished per second since the tournament started',
+             [({}, num_done / elapsed if elapsed > 0 else 0.)]),
+            ('pokerbots_worker_last_seen_seconds', 'gauge', 'Seconds since each connected worker was last heard from',
+             [({'worker': worker}, now - seen) for worker, seen in workers.items()]),
+            ('pokerbots_bankroll', 'gauge', 'Total bankroll of each bot over finished matches',
+             [({'bot': name}, bankroll) for name, bankroll in standings.items()]),
+        ]
+
+    def standings(self):
+        '''
+        Returns {bot name: total bankroll} over all finished matches.
+        '''
+        totals = {}
+        for result in self.results.values():
+            for bot in result['bots']:
+                totals[bot['name']] = totals.get(bot['name'], 0) + bot['bankroll']
+        return totals
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    '''
+    Serves one worker connection.
+    '''
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        worker = '{}:{}'.format(*self.client_address)
+        wfile = self.request.makefile('w')
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                if message['type'] == 'hello':
+                    worker = '{} ({}:{})'.format(message['worker'], *self.client_address)
+                    coordinator.heartbeat(worker)
+                    print(worker, 'connected')
+                elif message['type'] == 'heartbeat':
+                    coordinator.heartbeat(worker)
+                elif message['type'] == 'result':
+                    coordinator.complete(worker, message['match_id'], message['result'], message['logs'])
+                elif message['type'] == 'failed':
+                    print('Match {} failed on {}:\n{}'.format(message['match_id'], worker, message['error']))
+                    coordinator.fail(worker, message['match_id'], message['error'])
+                elif message['type'] == 'request':
+                    if coordinator.finished.is_set():
+                        send_message(wfile, {'type': 'done'})
+                        break
+                    match = coordinator.next_match(worker)
+                    if match is None:
+                        send_message(wfile, {'type': 'wait', 'seconds': 1.0})
+                    else:
+                        send_message(wfile, {'type': 'match', 'match': match})
+        except (OSError, ValueError):
+            pass
+        finally:
+            coordinator.requeue(worker, 'disconnected')
+            with coordinator.lock:
+                coordinator.workers.pop(worker, None)
+            print(worker, 'disconnected')
+
+
+class CoordinatorServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def load_checkpoint(out_folder, matches):
+    '''
+    Returns {match_id: result} from the checkpoint in out_folder, which must hold the same schedule.
+    '''
+    path = os.path.join(out_folder, CHECKPOINT_NAME)
+    if not os.path.exists(path):
+        raise SystemExit('No unfinished tournament to resume in {}'.format(out_folder))
+    with open(path) as checkpoint_file:
+        saved = json.load(checkpoint_file)
+    if saved['matches'] != json.loads(json.dumps(matches)):
+        raise SystemExit('The checkpoint in {} is for a different set of bots or games'.format(out_folder))
+    return {int(match_id): result for match_id, result in saved['results'].items()}
+
+
+def run_coordinator(args):
+    '''
+    Serves the tournament until every match has a result, then writes the summary.
+    '''
+    bots = []
+    for spec in args.bot:
+        name, file_path = spec.split('=', 1)
+        bots.append((name, os.path.abspath(file_path)))
+    matches = make_pairings(bots, args.games)
+    if not matches:
+        raise SystemExit('Nothing to play: give at least two --bot options and --games of at least 1')
+    os.makedirs(args.out, exist_ok=True)
+    results = None
+    if args.resume:
+        results = load_checkpoint(args.out, matches)
+        print('Resuming with {} of {} matches done'.format(len(results), len(matches)))
+    coordinator = Coordinator(matches, args.out, args.heartbeat_timeout, results, args.max_attempts)
+
+    server = CoordinatorServer((args.bind, args.port), WorkerHandler)
+    server.coordinator = coordinator
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Thread(target=coordinator.monitor, daemon=True).start()
+    print('Coordinator listening on {}:{} with {} matches'.format(args.bind, server.server_address[1], len(matches)))
+    metrics_server = None
+    local_workers = []
+    start_time = time.perf_counter()
+    # the finally block frees the ports even if the coordinator raises
+    try:
+        if args.metrics is not None:
+            from metrics import MetricsServer
+            metrics_server = MetricsServer(args.metrics, coordinator.collect_metrics).start()
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+        for i in range(args.local_workers):
+            argv = [sys.executable, os.path.abspath(__file__), 'worker', '--host', 'localhost',
+                    '--port', str(server.server_address[1]), '--name', 'local-{}'.format(i)] + limit_argv(args)
+            if args.pin and cpus:
+                # one core per bot, so each worker gets its own pair while there are enough cores
+                argv += ['--cores', '{},{}'.format(cpus[2 * i % len(cpus)], cpus[(2 * i + 1) % len(cpus)])]
+            if args.small_log:
+                argv.append('--small_log')
+            local_workers.append(subprocess.Popen(argv))
+        coordinator.finished.wait()
+    finally:
+        for proc in local_workers:
+            try:
+                proc.wait(timeout=HEARTBEAT_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        server.shutdown()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+    with open(os.path.join(args.out, 'results.json'), 'w') as results_file:
+        json.dump([coordinator.results[match_id] for match_id in sorted(coordinator.results)], results_file, indent=1)
+    if coordinator.failed:
+        with open(os.path.join(args.out, 'failed.json'), 'w') as failed_file:
+            json.dump([dict(matches[match_id], error=coordinator.failed[match_id]) for match_id in sorted(coordinator.failed)],
+                      failed_file, indent=1)
+        print('\n{} matches failed, see {}; --resume retries them'.format(len(coordinator.failed),
+                                                                           os.path.join(args.out, 'failed.json')))
+    elif os.path.exists(os.path.join(args.out, CHECKPOINT_NAME)):
+        os.remove(os.path.join(args.out, CHECKPOINT_NAME))  # the tournament is over, nothing to resume
+    print('\n=== Standings ===')
+    for name, bankroll in sorted(coordinator.standings().items(), key=lambda item: -item[1]):
+        print('  {}: {:+d}'.format(name, bankroll))
+    print('\nTotal Tournament Time: {:.3f}s'.format(time.perf_counter() - start_time))
+
+
+# Worker ---------------------------------------------------------------------------------------------
+def heartbeat_loop(sockfile, lock, stop):
+    '''
+    Sends heartbeats until stop is set.
+    '''
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        try:
+            send_message(sockfile, {'type': 'heartbeat'}, lock)
+        except OSError:
+            return
+
+
+def run_worker(args):
+    '''
+    Pulls matches from the coordinator and plays them until told the tournament is done.
+    '''
+    from engine import PokerMatch
+
+    try:
+        sock = socket.create_connection((args.host, args.port))
+    except OSError:
+        print('Could not connect to {}:{}'.format(args.host, args.port))
+        return
+    sockfile = sock.makefile('rw')
+    lock = threading.Lock()
+    stop = threading.Event()
+    threading.Thread(target=heartbeat_loop, args=(sockfile, lock, stop), daemon=True).start()
+    try:
+        send_message(sockfile, {'type': 'hello', 'worker': args.name}, lock)
+        while True:
+            send_message(sockfile, {'type': 'request'}, lock)
+            line = sockfile.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message['type'] == 'done':
+                break
+            if message['type'] == 'wait':
+                time.sleep(message['seconds'])
+                continue
+            match = message['match']
+            with tempfile.TemporaryDirectory() as log_folder:
+                try:
+                    result = PokerMatch(small_log=args.small_log, bots=match['bots'], log_folder=log_folder,
+                                        metrics=args.metrics, limits=parse_limit_args(args)).run()
+                except Exception:
+                    send_message(sockfile, {'type': 'failed', 'match_id': match['match_id'],
+                                            'error': traceback.format_exc()}, lock)
+                    continue
+                logs = {}
+                for name in os.listdir(log_folder):
+                    with open(os.path.join(log_folder, name), errors='replace') as log_file:
+                        logs[name] = log_file.read()
+            send_message(sockfile, {'type': 'result', 'match_id': match['match_id'], 'result': result, 'logs': logs}, lock)
+    except OSError:
+        print('Lost connection to the coordinator')
+    finally:
+        stop.set()
+        sockfile.close()
+        sock.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+    coordinator_parser = subparsers.add_parser('coordinator', help='Serve a round-robin tournament to workers')
+    coordinator_parser.add_argument('--bot', action='append', required=True, help='NAME=PATH, given at least twice')
+    coordinator_parser.add_argument('--games', type=int, default=2, help='Matches per pair of bots')
+    coordinator_parser.add_argument('--bind', type=str, default='', help='Address to listen on, defaults to all interfaces')
+    coordinator_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    coordinator_parser.add_argument('--out', type=str, default=os.path.join(GAME_LOG_FOLDER, 'tournament'), help='Folder for results and logs')
+    coordinator_parser.add_argument('--local-workers', type=int, default=0, help='Worker processes to spawn on this host')
+    coordinator_parser.add_argument('--heartbeat-timeout', type=float, default=HEARTBEAT_TIMEOUT, help='Seconds before a silent worker is dropped')
+    coordinator_parser.add_argument('--metrics', type=str, default=None, help='Serve tournament metrics on this localhost port or unix:/path socket')
+    coordinator_parser.add_argument('--pin', action='store_true', help='Pin the bots of each local worker to their own cores')
+    coordinator_parser.add_argument('--small_log', action='store_true', help='Have local workers use the compressed logging format')
+    coordinator_parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                                    help='Give up on a match after it fails this many times')
+    coordinator_parser.add_argument('--resume', action='store_true', help='Skip the matches already finished in the --out checkpoint')
+    add_limit_args(coordinator_parser, cores=False)
+    worker_parser = subparsers.add_parser('worker', help='Play matches handed out by a coordinator')
+    worker_parser.add_argument('--host', type=str, default='localhost', help='Coordinator host')
+    worker_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Coordinator port')
+    worker_parser.add_argument('--name', type=str, default=socket.gethostname(), help='Name shown by the coordinator')
+    worker_parser.add_argument('--small_log', action='store_true', help='Use compressed logging format')
+    worker_parser.add_argument('--metrics', type=str, default=None, help='Serve metrics of the running match on this localhost port or unix:/path socket')
+    add_limit_args(worker_parser)
+    args = parser.parse_args()
+    if args.mode == 'coordinator':
+        run_coordinator(args)
+    else:
+        try:
+            parse_limit_args(args)
+        except ValueError as e:
+            worker_parser.error(str(e))
+        run_worker(args)
@@ -3,6 +3,8 @@
 DO NOT REMOVE, RENAME, OR EDIT THIS FILE
 '''
 from collections import namedtuple
+from functools import lru_cache
+from itertools import permutations
 import eval7
 import argparse
 import json
@@ -11,21 +13,30 @@ from queue import Queue
 import subprocess
 import socket
 import sys
-from threading import Thread
+from threading import Lock, Thread
 import time
 from datetime import datetime
 import traceback
 import random
+try:
+    import resource
+except ImportError:  # Windows, where the resource limits are unsupported
+    resource = None
 
 sys.path.append(os.getcwd())
 
 from config import *
+from pkbot.cards import CARD_ID
+from pkbot.evaluator import PREFLOP_PATH, load_preflop_table, preflop_odds, showdown_odds
+from tracing import Tracer, NULL_TRACER
 
 PLAYER_LOG_SIZE_LIMIT = 524288
 
 GAME_CLOCK = 30.0
 BUILD_TIMEOUT = 10.0
 CONNECT_TIMEOUT = 10.0
+CHECKPOINT_EVERY = 50
+ALLIN_CACHE_SIZE = 4096
 
 NUM_ROUNDS = 1000
 STARTING_STACK = 5000
@@ -38,6 +49,7 @@ PCARDS = lambda cards: '[{}]'.format(' '.join(map(str, cards)))
 PVALUE = lambda name, value: ', {} ({})'.format(name, value)
 STATUS = lambda players: ''.join([PVALUE(p.name, p.bankroll) for p in players])
 STREET_LABELS = ['Flop', 'Turn', 'River']
+STREET_NAMES = {0: 'pre-flop', 3: 'flop', 4: 'turn', 5: 'river'}
 
 # Actions --------------------------------------------------------------------------------------------
 ActionFold = namedtuple('ActionFold', [])
@@ -55,6 +67,18 @@ DECODE_ACTION = {
 }
 
 # States ---------------------------------------------------------------------------------------------
+class MatchDeck(eval7.Deck):
+    '''
+    An eval7 deck with its own random source, which also picks the cards revealed by the auction.
+    Seeded matches give each hand its own random.Random, so matches in parallel threads never
+    share random state.
+    '''
+    rng = random
+
+    def shuffle(self):
+        self.rng.shuffle(self.cards)
+
+
 HandResult = namedtuple('HandResult', ['payoffs', 'bids', 'parent_state'])
 
 class GameState(
@@ -157,9 +181,10 @@ class GameState(
             self.bids[active] = action.amount
 
             if None not in self.bids: 
+                rng = getattr(self.deck, 'rng', random)  # plain eval7 decks reveal from the global generator
                 if self.bids[0] == self.bids[1]:
-                    rv_card_0 = random.choice(self.hands[0])
-                    rv_card_1 = random.choice(self.hands[1])
+                    rv_card_0 = rng.choice(self.hands[0])
+                    rv_card_1 = rng.choice(self.hands[1])
                     self.opp_hands[0].append(rv_card_1)
                     self.opp_hands[1].append(rv_card_0)
 
@@ -170,7 +195,7 @@ class GameState(
 
                 else:
                     winner = self.bids.index(max(self.bids))
-                    revealed_card = random.choice(self.hands[1 - winner])
+                    revealed_card = rng.choice(self.hands[1 - winner])
                     self.opp_hands[winner].append(revealed_card)
 
                     new_chips = list(self.chips)
@@ -190,15 +215,103 @@ class GameState(
         return GameState(self.dealer + 1, self.street, self.auction, self.bids, next_wagers, next_chips, self.hands, self.opp_hands, self.deck, self)
 
 
+# All-in EV ------------------------------------------------------------------------------------------
+@lru_cache(maxsize=ALLIN_CACHE_SIZE)
+def allin_odds(board, hand0, hand1):
+    '''
+    Returns (win, tie, loss) for hand0 against hand1, from the pre-flop table with no board and
+    by enumerating every runout otherwise. Cached by suit-canonical cards.
+    '''
+    if not board:
+        return preflop_odds(hand0, hand1)
+    return showdown_odds(hand0, hand1, board)
+
+
+def ensure_preflop_table():
+    '''
+    Builds the pre-flop odds table if it is missing, so it is not built during the first
+    pre-flop all-in of a match.
+    '''
+    if not os.path.exists(PREFLOP_PATH):
+        print('Building the pre-flop odds table', PREFLOP_PATH)
+        load_preflop_table()
+
+
+def allin_locked(state):
+    '''
+    True when no more chips can move: betting is closed with a player all-in. An auction can
+    still follow, but the all-in player must bid 0, so nobody pays.
+    '''
+    return isinstance(state, GameState) and 0 in state.chips and state.wagers[0] == state.wagers[1]
+
+
+def allin_ev(state, street):
+    '''
+    Returns player 0's expected payoff for a state where allin_locked holds, averaged over every
+    runout of the board from the street cards dealt when betting closed. Closing the betting
+    already moves the state to the next street, so state.street may be past the known cards.
+    Revealed cards need no special care, since both hands are known here.
+    '''
+    cards = [[CARD_ID[str(card)] for card in group]
+             for group in (state.deck.peek(street), state.hands[0], state.hands[1])]
+    key = min(tuple(tuple(sorted(card - card % 4 + perm[card % 4] for card in group)) for group in cards)
+              for perm in permutations(range(4)))
+    win, tie, loss = allin_odds(*key)
+    return (win * (STARTING_STACK - state.chips[1]) + tie * ((state.chips[0] - state.chips[1]) // 2)
+            + loss * (state.chips[0] - STARTING_STACK))
+
+
 # BotWrapper --------------------------------------------------------------------------------------
+# Per-bot resource controls; None leaves a control off. cores is a list of CPU ids to pin to.
+BotLimits = namedtuple('BotLimits', ['memory_mb', 'cpu_seconds', 'cores', 'threads'], defaults=[None] * 4)
+NO_LIMITS = BotLimits()
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS', 'RAYON_NUM_THREADS']
+
+
+def apply_limits(pid, limits):
+    '''
+    Applies the memory, CPU time and affinity limits to the running bot process pid. Set from the
+    engine after the spawn rather than in a preexec_fn, which is unsafe while the engine has threads.
+    '''
+    if limits.memory_mb is not None:
+        size = limits.memory_mb * 2**20
+        resource.prlimit(pid, resource.RLIMIT_AS, (size, size))
+    if limits.cpu_seconds is not None:
+        # SIGXCPU at the soft limit, SIGKILL one second later
+        resource.prlimit(pid, resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + 1))
+    if limits.cores is not None:
+        os.sched_setaffinity(pid, limits.cores)
+
+
+def require_connection(bots):
+    '''
+    Stops the bots and raises if neither connected, instead of playing every hand as a double disconnect.
+    '''
+    if any(bot.socketfile is not None for bot in bots):
+        return
+    for bot in bots:
+        bot.stop()  # writes the player logs, which say why
+    hint = ' (is --memory_mb too low for them to start?)' if any(bot.limits.memory_mb for bot in bots) else ''
+    raise RuntimeError('Neither bot connected{}; see the player logs in {}'.format(hint, bots[0].log_folder))
+
+
+# BotProcess counters saved in match checkpoints
+CHECKPOINT_FIELDS = ('time_bank', 'bankroll', 'ev_bankroll', 'wins', 'auction_wins', 'auction_total', 'bids', 'timeouts',
+                     'illegal_actions', 'query_times', 'hand_response_times')
+
+
 class BotProcess:
     '''
     Manages the subprocess and socket connection for a single bot.
     '''
 
-    def __init__(self, name, file_path):
+    def __init__(self, name, file_path, log_folder=GAME_LOG_FOLDER, limits=NO_LIMITS, env=None):
         self.name = name
         self.file_path = file_path
+        self.log_folder = log_folder
+        self.limits = limits
+        self.env = env  # extra environment variables for the bot process
         self.time_bank = GAME_CLOCK
         self.bankroll = 0
         self.proc = None
@@ -210,6 +323,14 @@ class BotProcess:
         self.auction_wins = 0
         self.auction_total = 0
         self.bids = []
+        self.ev_bankroll = 0.
+        self.timeouts = 0
+        self.illegal_actions = 0
+        self.tracer = NULL_TRACER
+        self.trace_tid = 0
+        self.lock = Lock()  # held for a whole query, so tables sharing the process take turns
+        self.table_prefix = ''
+        self.resume_clause = None  # sent once, with the first query after resuming a match
 
     def run(self):
         '''
@@ -223,11 +344,17 @@ class BotProcess:
                 server_socket.listen()
                 port = server_socket.getsockname()[1]
 
+                env = None
+                if self.limits.threads is not None or self.env:
+                    env = dict(os.environ, **(self.env or {}))
+                    if self.limits.threads is not None:
+                        env.update({var: str(self.limits.threads) for var in THREAD_ENV_VARS})
                 proc = subprocess.Popen(
                     [PYTHON_CMD, self.file_path, str(port)],
                     stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                    cwd=os.path.dirname(self.file_path))
+                    cwd=os.path.dirname(self.file_path), env=env)
                 self.proc = proc
+                apply_limits(proc.pid, self.limits)
                 # function for bot listening
                 def enqueue_output(out, queue):
                     try:
@@ -273,8 +400,9 @@ class BotProcess:
                 self.proc.kill()
                 outs, _ = self.proc.communicate()
                 self.bytes_queue.put(outs)
-        os.makedirs(GAME_LOG_FOLDER, exist_ok=True)
-        with open(os.path.join(GAME_LOG_FOLDER, self.name + '.plog'), 'wb') as log_file:
+        os.makedirs(self.log_folder, exist_ok=True)
+        with self.tracer.span('write player log', always=True, bot=self.name), \
+                open(os.path.join(self.log_folder, self.name + '.plog'), 'wb') as log_file:
             bytes_written = 0
             for output in self.bytes_queue.queue:
                 try:
@@ -284,6 +412,27 @@ class BotProcess:
                 except TypeError:
                     pass
 
+    def read_reply(self):
+        '''
+        Reads the bot's answer to the query just sent.
+        '''
+        return self.socketfile.readline().strip()
+
+    def checkpoint_state(self):
+        '''
+        Returns the match counters of this bot as a JSON-serializable dict.
+        '''
+        return {field: getattr(self, field) for field in CHECKPOINT_FIELDS}
+
+    def restore_state(self, saved):
+        '''
+        Restores the counters saved by checkpoint_state.
+        '''
+        for field in CHECKPOINT_FIELDS:
+            setattr(self, field, saved[field])
+        # JSON turns the round numbers into strings
+        self.hand_response_times = {int(round_num): value for round_num, value in saved['hand_response_times'].items()}
+
     def query(self, state, player_message, game_log, round_num):
         '''
         Requests one action from the pokerbot over the socket connection.
@@ -293,14 +442,21 @@ class BotProcess:
         if self.socketfile is not None and self.time_bank > 0.:
             clause = ''
             try:
-                player_message[0] = 'T{:.3f}'.format(self.time_bank)
-                message = ' '.join(player_message) + '\n'
-                del player_message[1:]  # do not send redundant action history
-                start_time = time.perf_counter()
-                self.socketfile.write(message)
-                self.socketfile.flush()
-                clause = self.socketfile.readline().strip()
-                end_time = time.perf_counter()
+                with self.tracer.span('build message'):
+                    player_message[0] = 'T{:.3f}'.format(self.time_bank)
+                    if self.resume_clause is not None:
+                        player_message.insert(1, self.resume_clause)
+                        self.resume_clause = None
+                    message = self.table_prefix + ' '.join(player_message) + '\n'
+                    del player_message[1:]  # do not send redundant action history
+                with self.lock:
+                    start_time = time.perf_counter()
+                    with self.tracer.span('socket write'):
+                        self.socketfile.write(message)
+                        self.socketfile.flush()
+                    with self.tracer.span('think', tid=self.trace_tid, bot=self.name):
+                        clause = self.read_reply()
+                    end_time = time.perf_counter()
                 response_time = end_time - start_time
                 self.time_bank -= response_time
                 self.query_times.append(response_time)
@@ -312,6 +468,7 @@ class BotProcess:
                     if clause[0] == 'R':
                         if '.' in clause[1:]:
                             game_log.append(self.name + ' attempted illegal ActionRaise({}) with decimal'.format(clause[1:]))
+                            self.illegal_actions += 1
                             self.bytes_queue.put(f"[Round#{round_num}] Tried to raise with decimal amount: {clause[1:]}\n".encode())
                             return ActionCheck() if ActionCheck in valid_actions else ActionFold()
                         amount = int(clause[1:])
@@ -321,6 +478,7 @@ class BotProcess:
                     elif clause[0] == 'A':
                         if '.' in clause[1:]:
                             game_log.append(self.name + ' attempted illegal bid with decimal')
+                            self.illegal_actions += 1
                             self.bytes_queue.put(f"[Round#{round_num}] Tried to bid with decimal amount: {clause[1:]}\n".encode())
                             return ActionCheck() if ActionCheck in valid_actions else ActionFold()
                         amount = int(clause[1:])
@@ -329,7 +487,8 @@ class BotProcess:
                             return action(amount)
                     else:
                         return action()
-                
+
+                self.illegal_actions += 1
                 if clause[0] in ('R', 'A'):
                     game_log.append(self.name + ' attempted illegal ' + action.__name__ + ' with amount ' + str(int(clause[1:])))
                 else:
@@ -340,6 +499,7 @@ class BotProcess:
                 game_log.append(error_message)
                 print(error_message)
                 self.time_bank = 0.
+                self.timeouts += 1
             except OSError:
                 error_message = self.name + ' disconnected'
                 game_log.append(error_message)
@@ -347,22 +507,172 @@ class BotProcess:
                 self.time_bank = 0.
             except (IndexError, KeyError, ValueError) as e:
                 game_log.append(self.name + ' response misformatted: ' + str(clause))
+                self.illegal_actions += 1
         # set a base bid action of 0 if pokerbot fails to submit legal bid action
         if ActionBid in valid_actions: 
             return ActionBid(0)
         
         return ActionCheck() if ActionCheck in valid_actions else ActionFold()
 
+class TableBot(BotProcess):
+    '''
+    One table's seat for a bot process that serves several concurrent matches (--tables).
+    Keeps its own time bank and stats; messages and replies carry the table id.
+    '''
+
+    def __init__(self, process, table):
+        super().__init__(process.name, process.file_path, process.log_folder, process.limits, process.env)
+        self.process = process
+        self.table = table
+        self.table_prefix = 'I{} '.format(table)
+        self.lock = process.lock
+        self.bytes_queue = process.bytes_queue  # errors go to the process's player log
+
+    def run(self):
+        '''
+        Attaches to the already running process.
+        '''
+        self.socketfile = self.process.socketfile
+
+    def read_reply(self):
+        '''
+        Reads lines until the reply for this table; a late reply to another table's timed out
+        query is dropped, since that table will not query again.
+        '''
+        while True:
+            line = self.socketfile.readline()
+            if not line:
+                return ''
+            table, _, clause = line.strip().partition(' ')
+            if table == self.table_prefix.strip():
+                return clause
+
+    def stop(self):
+        '''
+        Tells the bot the table is closed; the process is stopped once all tables are done.
+        '''
+        if self.socketfile is not None:
+            try:
+                with self.lock:
+                    self.socketfile.write(self.table_prefix + 'Q\n')
+                    self.socketfile.flush()
+            except OSError:
+                pass
+
 # PokerMatch -------------------------------------------------------------------------------------------------
+STATS_LOCK = Lock()  # matches on concurrent tables print their stats one at a time
+
+
 class PokerMatch():
     '''Manages logging and the high-level game procedure.'''
 
-    def __init__(self, small_log=False):
+    def __init__(self, small_log=False, bots=None, log_folder=GAME_LOG_FOLDER, db_path=None, metrics=None, tracer=NULL_TRACER,
+                 limits=(NO_LIMITS, NO_LIMITS), env=(None, None), seed=None, processes=None, table=None, allin_ev=False,
+                 checkpoint=None, checkpoint_every=CHECKPOINT_EVERY, resume=False):
         self.small_log = small_log
+        # with a checkpoint path, the match state is saved every checkpoint_every hands and the
+        # game log is written as it goes; resume continues from the saved state
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.resume = resume
+        # also score hands by their all-in expected value, see allin_ev
+        self.allin_ev = allin_ev
+        self.allin_hands = 0
+        # with processes (two running BotProcesses), the match is one table of several sharing them
+        self.processes = processes
+        self.table = table
+        self.limits = limits  # one BotLimits per bot
+        self.env = env  # one dict of extra environment variables (or None) per bot
+        # with a seed, every hand's deal depends only on the seed and the round number, so
+        # different bots facing the same opponent see identical cards
+        self.seed = seed
+        self.tracer = tracer
+        self.db_path = db_path
+        self.metrics = metrics
+        self.latency = {}  # metrics.StreamingSummary of each bot's query times, fed on every scrape
+        self.players = []
+        self.hands_played = 0
+        self.hand_summaries = []
+        # [(name, file_path), (name, file_path)], defaulting to the bots in config.py
+        self.bots = bots if bots is not None else [(BOT_1_NAME, BOT_1_FILE), (BOT_2_NAME, BOT_2_FILE)]
+        self.log_folder = log_folder
         self.timestamp = datetime.now()
-        self.log = [self.timestamp.strftime('%Y-%m-%d %H:%M:%S ') + BOT_1_NAME + ' vs ' + BOT_2_NAME]
+        self.log_name = self.make_log_name()
+        self.log = [self.timestamp.strftime('%Y-%m-%d %H:%M:%S ') + self.bots[0][0] + ' vs ' + self.bots[1][0]]
+        self.log_lines_written = 0
         self.player_messages = [[], []]
 
+    def make_log_name(self):
+        '''
+        Returns the game log file name, from the match start time.
+        '''
+        name = self.timestamp.strftime('%Y%m%d-%H%M%S-%f')
+        return name + ('.glog' if self.table is None else '-table{}.glog'.format(self.table))
+
+    def write_log(self):
+        '''
+        Appends the game log lines not written yet to the log file.
+        '''
+        lines = self.log[self.log_lines_written:]
+        os.makedirs(self.log_folder, exist_ok=True)
+        with open(os.path.join(self.log_folder, self.log_name), 'a') as log_file:
+            log_file.write(('\n' if self.log_lines_written else '') + '\n'.join(lines))
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        self.log_lines_written = len(self.log)
+
+    def save_checkpoint(self, all_bots, rounds_played):
+        '''
+        Writes the game log so far and the state needed to continue the match after rounds_played.
+        '''
+        self.write_log()
+        checkpoint = {
+            'bots': self.bots,
+            'seed': self.seed,
+            'started': self.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'rounds_played': rounds_played,
+            'match_time': time.perf_counter() - self.start_time,
+            'random_state': random.getstate(),
+            'log_size': os.path.getsize(os.path.join(self.log_folder, self.log_name)),
+            'allin_hands': self.allin_hands,
+            'players': [bot.checkpoint_state() for bot in all_bots],
+            'hand_summaries': self.hand_summaries,
+        }
+        # write next to the checkpoint and rename, so a crash never leaves a partial file
+        tmp_path = self.checkpoint + '.tmp'
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(tmp_path, self.checkpoint)
+
+    def load_checkpoint(self, all_bots):
+        '''
+        Restores the match from the checkpoint, dropping log lines written after it was saved.
+        Returns the number of rounds already played.
+        '''
+        with open(self.checkpoint) as checkpoint_file:
+            saved = json.load(checkpoint_file)
+        if saved['bots'] != [list(bot) for bot in self.bots] or saved['seed'] != self.seed:
+            raise ValueError('{} is the checkpoint of a different match'.format(self.checkpoint))
+        self.timestamp = datetime.strptime(saved['started'], '%Y-%m-%d %H:%M:%S.%f')
+        self.log_name = self.make_log_name()
+        log_path = os.path.join(self.log_folder, self.log_name)
+        with open(log_path, 'r+b') as log_file:
+            log_file.truncate(saved['log_size'])
+        with open(log_path) as log_file:
+            self.log = log_file.read().split('\n')
+        self.log_lines_written = len(self.log)
+        version, internal_state, gauss = saved['random_state']
+        random.setstate((version, tuple(internal_state), gauss))
+        self.start_time -= saved['match_time']
+        self.allin_hands = saved['allin_hands']
+        self.hand_summaries = saved['hand_summaries']
+        self.hands_played = saved['rounds_played']
+        for bot, bot_state in zip(all_bots, saved['players']):
+            bot.restore_state(bot_state)
+            # the restarted bot learns the round and its bankroll from a G clause
+            bot.resume_clause = 'G{},{}'.format(saved['rounds_played'] + 1, bot.bankroll)
+        return saved['rounds_played']
+
     def log_state(self, players, state: GameState):
         '''
         Incorporates GameState information into the game log and player messages.
@@ -447,22 +757,38 @@ class PokerMatch():
         '''
         Runs one round of poker.
         '''
-        deck = eval7.Deck()
+        deck = MatchDeck()
+        if self.seed is not None:
+            deck.rng = random.Random('{}:{}'.format(self.seed, round_num))
         deck.shuffle()
         hands = [deck.deal(2), deck.deal(2)]
         wagers = [SMALL_BLIND, BIG_BLIND]
         chips = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
         state = GameState(0, 0, False, [None, None], wagers, chips, hands, [[], []], deck, None)
-        
+        first_query = [len(player.query_times) for player in players]
+
+        tracer = self.tracer
+        ev = None
         while not isinstance(state, HandResult):
-            self.log_state(players, state)
+            tracer.set_street('auction' if state.auction else STREET_NAMES[state.street])
+            with tracer.span('log state'):
+                self.log_state(players, state)
             active = state.dealer % 2
             player = players[active]
-            action = player.query(state, self.player_messages[active], self.log, round_num)
+            # the query span's own time, outside its children, is response parsing
+            with tracer.span('query', bot=player.name):
+                action = player.query(state, self.player_messages[active], self.log, round_num)
             bet_override = (state.wagers == [0, 0])
-            self.log_action(player.name, action, bet_override)
+            with tracer.span('log action'):
+                self.log_action(player.name, action, bet_override)
             previous_auction = state.auction
-            state = state.apply_action(action)
+            previous_street = state.street
+            with tracer.span('apply action'):
+                state = state.apply_action(action)
+            # a lock on the river leaves no cards to come, so the actual payoff is the EV
+            if self.allin_ev and ev is None and previous_street < 5 and allin_locked(state):
+                with tracer.span('all-in ev'):
+                    ev = allin_ev(state, previous_street)
             if previous_auction and not isinstance(state, HandResult) and not state.auction:
                 players[0].auction_total += 1
                 players[1].auction_total += 1
@@ -473,18 +799,81 @@ class PokerMatch():
                 elif state.bids[1] > state.bids[0]:
                     players[1].auction_wins += 1
             
-        self.log_result(players, state)
+        with tracer.span('log result'):
+            self.log_result(players, state)
+        ev_payoffs = None
+        if self.allin_ev:
+            ev_payoffs = list(state.payoffs) if ev is None else [ev, -ev]
+            for player, ev_payoff in zip(players, ev_payoffs):
+                player.ev_bankroll += ev_payoff
+            if ev is not None:
+                self.allin_hands += 1
+                for player, ev_payoff in zip(players, ev_payoffs):
+                    self.log.append('{} all-in EV {:+.2f}'.format(player.name, ev_payoff))
         for player, player_message, delta in zip(players, self.player_messages, state.payoffs):
-            player.query(state, player_message, self.log, round_num)
+            with tracer.span('query', bot=player.name):
+                player.query(state, player_message, self.log, round_num)
             player.bankroll += delta
             if delta > 0:
                 player.wins += 1
+        self.summarize_hand(players, round_num, state, first_query, ev_payoffs)
+
+    def summarize_hand(self, players, round_num, result, first_query, ev_payoffs=None):
+        '''
+        Records the per-hand summary that is written to the results database.
+        '''
+        final = result.parent_state
+        bids = None if None in final.bids else list(final.bids)
+        if bids is None:
+            auction_winner = None
+        elif bids[0] == bids[1]:
+            auction_winner = 'tie'
+        else:
+            auction_winner = players[bids.index(max(bids))].name
+        query_times = [player.query_times[start:] for player, start in zip(players, first_query)]
+        self.hand_summaries.append({
+            'round': round_num,
+            'players': [player.name for player in players],
+            'street': final.street,
+            'showdown': final.wagers[0] == final.wagers[1],
+            'bids': bids,
+            'auction_winner': auction_winner,
+            'pot': 2 * STARTING_STACK - final.chips[0] - final.chips[1],
+            'payoffs': list(result.payoffs),
+            'ev_payoffs': ev_payoffs,
+            'queries': [len(times) for times in query_times],
+            'query_time': [sum(times) for times in query_times],
+            'max_query_time': [max(times, default=0.) for times in query_times],
+        })
+
+    def collect_metrics(self):
+        '''
+        Returns the live match metrics for metrics.MetricsServer.
+        '''
+        from metrics import StreamingSummary, summary
+        players = list(self.players)
+        elapsed = time.perf_counter() - self.start_time
+        for bot in players:
+            self.latency.setdefault(bot, StreamingSummary()).update(bot.query_times)
+        per_bot = lambda value: [({'bot': bot.name}, value(bot)) for bot in players]
+        return [
+            ('pokerbots_hands_played_total', 'counter', 'Hands finished in this match', [({}, self.hands_played)]),
+            ('pokerbots_hands_per_second', 'gauge', 'Hands finished per second since the match started',
+             [({}, self.hands_played / elapsed if elapsed > 0 else 0.)]),
+            ('pokerbots_bankroll', 'gauge', 'Running bankroll of each bot', per_bot(lambda bot: bot.bankroll)),
+            ('pokerbots_time_bank_seconds', 'gauge', 'Remaining time bank of each bot', per_bot(lambda bot: bot.time_bank)),
+            ('pokerbots_timeouts_total', 'counter', 'Times each bot ran out of time', per_bot(lambda bot: bot.timeouts)),
+            ('pokerbots_illegal_actions_total', 'counter', 'Illegal or misformatted actions by each bot',
+             per_bot(lambda bot: bot.illegal_actions)),
+            summary('pokerbots_query_latency_seconds', 'Response time of each bot per query',
+                    [({'bot': bot.name}, self.latency[bot]) for bot in players]),
+        ]
 
     def run(self):
         '''
         Runs one game of poker.
         '''
-        start_time = time.perf_counter()
+        self.start_time = time.perf_counter()
         if not self.small_log:
             print('██ ██ ████████     ██████   ██████  ██   ██ ███████ ██████  ██████   ██████  ████████ ███████ ')
             print('██ ██    ██        ██   ██ ██    ██ ██  ██  ██      ██   ██ ██   ██ ██    ██    ██    ██      ')
@@ -493,64 +882,232 @@ class PokerMatch():
             print('██ ██    ██        ██       ██████  ██   ██ ███████ ██   ██ ██████   ██████     ██    ███████ ')
             print()
         print('Initializing Game Engine...')
-        players = [
-            BotProcess(BOT_1_NAME, BOT_1_FILE),
-            BotProcess(BOT_2_NAME, BOT_2_FILE)
-        ]
+        if self.allin_ev:
+            ensure_preflop_table()
+        if self.processes is not None:
+            players = [TableBot(process, self.table) for process in self.processes]
+        else:
+            players = [BotProcess(name, file_path, self.log_folder, limits, env)
+                       for (name, file_path), limits, env in zip(self.bots, self.limits, self.env)]
         all_bots = list(players)
-        for player in players:
-            player.run()
-        for round_num in range(1, NUM_ROUNDS + 1):
+        self.players = all_bots
+        first_round = 1
+        if self.resume:
+            first_round = self.load_checkpoint(all_bots) + 1
+            print('Resuming from round', first_round)
+            if first_round % 2 == 0:  # seats swap every round
+                players = players[::-1]
+        start_time = self.start_time
+        for tid, bot in enumerate(all_bots, 1):
+            bot.tracer = self.tracer
+            bot.trace_tid = tid
+            self.tracer.name_thread(tid, bot.name)
+        metrics_server = None
+        if self.metrics is not None:
+            from metrics import MetricsServer
+            metrics_server = MetricsServer(self.metrics, self.collect_metrics).start()
+        try:
+            for player in players:
+                player.run()
+            require_connection(players)
+            for round_num in range(first_round, NUM_ROUNDS + 1):
+                self.log.append('')
+                self.log.append('Round #' + str(round_num) + STATUS(players))
+                self.tracer.start_hand(round_num)
+                with self.tracer.span('hand', seats=[player.name for player in players]):
+                    self.play_hand(players, round_num)
+                self.hands_played += 1
+                players = players[::-1]
+                if self.checkpoint is not None and round_num % self.checkpoint_every == 0 and round_num < NUM_ROUNDS:
+                    with self.tracer.span('checkpoint', always=True):
+                        self.save_checkpoint(all_bots, round_num)
             self.log.append('')
-            self.log.append('Round #' + str(round_num) + STATUS(players))
-            self.play_hand(players, round_num)
-            players = players[::-1]
-        self.log.append('')
-        self.log.append('Final' + STATUS(players))
-
-        print("\n=== Game Stats ===")
-        for bot in all_bots:
-            print(f"\nStats for {bot.name}:")
-            total_queries = len(bot.query_times)
-            avg_query = sum(bot.query_times) / total_queries if total_queries > 0 else 0.0
-            max_query = max(bot.query_times) if total_queries > 0 else 0.0
-            avg_hand_time = sum(bot.hand_response_times.values()) / NUM_ROUNDS
-            win_rate = bot.wins / NUM_ROUNDS
-            avg_payoff = bot.bankroll / NUM_ROUNDS
-            auction_rate = bot.auction_wins / bot.auction_total if bot.auction_total > 0 else 0.0
+            self.log.append('Final' + STATUS(players))
+            if self.allin_ev:
+                self.log.append('EV-adjusted' + ''.join(PVALUE(p.name, '{:.1f}'.format(p.ev_bankroll)) for p in players))
+
+            with STATS_LOCK:
+                print("\n=== Game Stats ===" if self.table is None else "\n=== Game Stats (table {}) ===".format(self.table))
+                for bot in all_bots:
+                    print(f"\nStats for {bot.name}:")
+                    total_queries = len(bot.query_times)
+                    avg_query = sum(bot.query_times) / total_queries if total_queries > 0 else 0.0
+                    max_query = max(bot.query_times) if total_queries > 0 else 0.0
+                    avg_hand_time = sum(bot.hand_response_times.values()) / NUM_ROUNDS
+                    win_rate = bot.wins / NUM_ROUNDS
+                    avg_payoff = bot.bankroll / NUM_ROUNDS
+                    auction_rate = bot.auction_wins / bot.auction_total if bot.auction_total > 0 else 0.0
             
-            if bot.bids:
-                avg_bid = sum(bot.bids) / len(bot.bids)
-                var_bid = sum((x - avg_bid) ** 2 for x in bot.bids) / len(bot.bids)
-            else:
-                avg_bid = 0.0
-                var_bid = 0.0
+                    if bot.bids:
+                        avg_bid = sum(bot.bids) / len(bot.bids)
+                        var_bid = sum((x - avg_bid) ** 2 for x in bot.bids) / len(bot.bids)
+                    else:
+                        avg_bid = 0.0
+                        var_bid = 0.0
             
-            print(f"  Total Bankroll: {bot.bankroll}")
-            print(f"------------------------------------------------------------")
-            print(f"  Win Rate: {win_rate:.1%}")
-            print(f"  Avg Payoff/Hand: {avg_payoff:.2f}")
-            print(f"------------------------------------------------------------")
-            print(f"  Auction Win Rate: {auction_rate:.1%}")
-            print(f"  Avg Bid Amount (Mean, Var): ({avg_bid:.2f}, {var_bid:.2f})")
-            print(f"------------------------------------------------------------")
-            print(f"  Avg Response Time (Query): {avg_query:.5f}s")
-            print(f"  Avg Response Time (Hand): {avg_hand_time:.5f}s")
-            print(f"  Max Response Time: {max_query:.5f}s")
-
-        print(f"\nTotal Match Time: {time.perf_counter() - start_time:.3f}s")
-        for player in players:
-            player.stop()
-
-        name = f"{self.timestamp.strftime('%Y%m%d-%H%M%S-%f')}.glog"
+                    print(f"  Total Bankroll: {bot.bankroll}")
+                    if self.allin_ev:
+                        print(f"  EV-adjusted Bankroll: {bot.ev_bankroll:.1f} ({self.allin_hands} all-in hands)")
+                    print(f"------------------------------------------------------------")
+                    print(f"  Win Rate: {win_rate:.1%}")
+                    print(f"  Avg Payoff/Hand: {avg_payoff:.2f}")
+                    print(f"------------------------------------------------------------")
+                    print(f"  Auction Win Rate: {auction_rate:.1%}")
+                    print(f"  Avg Bid Amount (Mean, Var): ({avg_bid:.2f}, {var_bid:.2f})")
+                    print(f"------------------------------------------------------------")
+                    print(f"  Avg Response Time (Query): {avg_query:.5f}s")
+                    print(f"  Avg Response Time (Hand): {avg_hand_time:.5f}s")
+                    print(f"  Max Response Time: {max_query:.5f}s")
+                    print(f"  Timeouts / Illegal Actions: {bot.timeouts} / {bot.illegal_actions}")
+
+                print(f"\nTotal Match Time: {time.perf_counter() - start_time:.3f}s")
+            for player in players:
+                player.stop()
+        finally:
+            # stop even if the match raised, so the port is free for the next match in this process
+            if metrics_server is not None:
+                metrics_server.stop()
+
+        name = self.log_name
         print('Writing game log to', name)
-        os.makedirs(GAME_LOG_FOLDER, exist_ok=True)
-        with open(os.path.join(GAME_LOG_FOLDER, name), 'w') as log_file:
-            log_file.write('\n'.join(self.log))
+        with self.tracer.span('write game log', always=True):
+            self.write_log()
+        if self.checkpoint is not None and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)  # the match is over, nothing to resume
+        self.tracer.write()
+
+        match_time = time.perf_counter() - start_time
+        if self.db_path is not None:
+            import results_db
+            conn = results_db.connect(self.db_path)
+            results_db.record_match(conn, {
+                'started': self.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'log_file': name,
+                'bots': [bot.name for bot in all_bots],
+                'bankrolls': [bot.bankroll for bot in all_bots],
+                'match_time': match_time,
+            }, self.hand_summaries)
+            conn.close()
+            print('Indexed match into', self.db_path)
+
+        return {
+            'log_file': name,
+            'bots': [{
+                'name': bot.name,
+                'bankroll': bot.bankroll,
+                'ev_bankroll': bot.ev_bankroll if self.allin_ev else None,
+                'wins': bot.wins,
+                'auction_wins': bot.auction_wins,
+                'auction_total': bot.auction_total,
+                'queries': len(bot.query_times),
+                'total_query_time': sum(bot.query_times),
+                'max_query_time': max(bot.query_times, default=0.),
+                'time_bank': bot.time_bank,
+                'timeouts': bot.timeouts,
+                'illegal_actions': bot.illegal_actions,
+            } for bot in all_bots],
+            'match_time': match_time,
+        }
+
+
+def run_tables(num_tables, bots=None, log_folder=GAME_LOG_FOLDER, limits=(NO_LIMITS, NO_LIMITS), seed=None, **match_args):
+    '''
+    Plays num_tables matches at once with one process per bot serving every table.
+    Each table keeps its own time banks and game log. Returns the results of PokerMatch.run.
+    '''
+    bots = bots if bots is not None else [(BOT_1_NAME, BOT_1_FILE), (BOT_2_NAME, BOT_2_FILE)]
+    if match_args.get('allin_ev'):
+        ensure_preflop_table()
+    processes = [BotProcess(name, file_path, log_folder, bot_limits)
+                 for (name, file_path), bot_limits in zip(bots, limits)]
+    for process in processes:
+        process.run()
+    require_connection(processes)
+    results = [None] * num_tables
+
+    def play(table):
+        table_seed = None if seed is None else '{}-{}'.format(seed, table)
+        results[table] = PokerMatch(bots=bots, log_folder=log_folder, seed=table_seed, processes=processes,
+                                    table=table, **match_args).run()
+    threads = [Thread(target=play, args=(table,)) for table in range(num_tables)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for process in processes:
+        process.stop()
+    return results
+
+
+def add_limit_args(parser, cores=True):
+    '''
+    Adds the per-bot resource limit options to an argument parser.
+    '''
+    parser.add_argument('--memory_mb', type=int, default=None, help='Address space limit per bot, in MB')
+    parser.add_argument('--cpu_seconds', type=int, default=None, help='CPU time limit per bot, in seconds')
+    if cores:
+        parser.add_argument('--cores', type=str, default=None,
+                            help='CPUs to pin the bots to, e.g. "2,3" pins the first bot to CPU 2 and the second to CPU 3')
+    parser.add_argument('--bot_threads', type=int, default=None, help='Thread count for BLAS/OpenMP/NumPy in each bot')
+
+
+def limit_argv(args):
+    '''
+    Turns the options added by add_limit_args back into command-line arguments.
+    '''
+    argv = []
+    for option in ('memory_mb', 'cpu_seconds', 'cores', 'bot_threads'):
+        if getattr(args, option, None) is not None:
+            argv += ['--' + option, str(getattr(args, option))]
+    return argv
+
+
+def parse_limit_args(args):
+    '''
+    Builds the (BotLimits, BotLimits) pair from the options added by add_limit_args.
+    '''
+    try:
+        cores = [int(core) for core in args.cores.split(',')] if args.cores else None
+    except ValueError:
+        raise ValueError('--cores must be a comma-separated list of CPU ids, not {!r}'.format(args.cores))
+    if cores and hasattr(os, 'sched_getaffinity') and not set(cores) <= os.sched_getaffinity(0):
+        raise ValueError('--cores {} is not a subset of the available CPUs {}'.format(args.cores, sorted(os.sched_getaffinity(0))))
+    return tuple(BotLimits(args.memory_mb, args.cpu_seconds, [cores[i % len(cores)]] if cores else None, args.bot_threads)
+                 for i in range(2))
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--small_log', action='store_true', help='Use compressed logging format')
+    parser.add_argument('--db', type=str, default=None, help='SQLite database to index the match and its hands into')
+    parser.add_argument('--metrics', type=str, default=None, help='Serve live metrics on this localhost port or unix:/path socket')
+    parser.add_argument('--trace', type=str, default=None, help='Write a Chrome trace-event JSON of the match timeline to this file')
+    parser.add_argument('--trace_every', type=int, default=10, help='Trace one hand in every n')
+    parser.add_argument('--seed', type=str, default=None, help='Deal every hand from this seed, for reproducible matches')
+    parser.add_argument('--allin_ev', action='store_true',
+                        help='Also report bankrolls with all-in hands scored by their expected value')
+    parser.add_argument('--tables', type=int, default=1, help='Play this many matches at once, one process per bot serving all of them')
+    parser.add_argument('--checkpoint', type=str, default=None,
+                        help='Save the match state to this file every --checkpoint_every hands, writing the game log as it goes')
+    parser.add_argument('--checkpoint_every', type=int, default=CHECKPOINT_EVERY, help='Hands between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='Continue the match saved in --checkpoint')
+    add_limit_args(parser)
     args = parser.parse_args()
-    PokerMatch(small_log=args.small_log).run()
\ No newline at end of file
+    if args.resume and args.checkpoint is None:
+        parser.error('--resume needs --checkpoint')
+    try:
+        limits = parse_limit_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.tables > 1:
+        if args.metrics or args.trace:
+            parser.error('--metrics and --trace need a single table')
+        if args.checkpoint:
+            parser.error('--checkpoint needs a single table')
+        run_tables(args.tables, limits=limits, seed=args.seed, small_log=args.small_log, db_path=args.db,
+                   allin_ev=args.allin_ev)
+        sys.exit()
+    tracer = Tracer(args.trace, args.trace_every) if args.trace else NULL_TRACER
+    PokerMatch(small_log=args.small_log, db_path=args.db, metrics=args.metrics, tracer=tracer,
+               limits=limits, seed=args.seed, allin_ev=args.allin_ev, checkpoint=args.checkpoint,
+               checkpoint_every=args.checkpoint_every, resume=args.resume).run()
\ No newline at end of file
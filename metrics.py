@@ -0,0 +1,152 @@
+'''
+Minimal Prometheus text-format exporter for running matches and tournaments.
+
+The address is either a port on localhost ('9100') or a Unix socket ('unix:/tmp/engine.sock').
+Scrape it with Prometheus, or by hand:
+
+    curl localhost:9100/metrics
+    curl --unix-socket /tmp/engine.sock http://localhost/metrics
+'''
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pkbot.stats import P2Quantile
+
+QUANTILES = [0.5, 0.9, 0.99, 1.0]
+
+
+def quantiles(values, qs=QUANTILES):
+    '''
+    Returns [(q, value)] nearest-rank quantiles of the values, or [] if there are none.
+    '''
+    if not values:
+        return []
+    ordered = sorted(values)
+    return [(q, ordered[min(int(q * len(ordered)), len(ordered) - 1)]) for q in qs]
+
+
+class StreamingSummary():
+    '''
+    Streaming quantiles, sum and count of a list that only grows, like BotProcess.query_times.
+    Each update reads just the values appended since the last one, so a scrape costs the same
+    late in a match as early on. Quantiles below 1 are P2Quantile estimates; 1 is the exact max.
+    '''
+
+    def __init__(self, qs=QUANTILES):
+        self.estimators = [(q, P2Quantile(q)) for q in qs if q < 1]
+        self.with_max = 1.0 in qs
+        self.seen = 0
+        self.total = 0.
+        self.maximum = None
+        self.lock = threading.Lock()  # scrapes are served on concurrent threads
+
+    def update(self, values):
+        '''
+        Adds values[seen:], the values appended since the last update.
+        '''
+        with self.lock:
+            new = values[self.seen:]
+            self.seen += len(new)
+            for value in new:
+                for _, estimator in self.estimators:
+                    estimator.add(value)
+                self.total += value
+                if self.maximum is None or value > self.maximum:
+                    self.maximum = value
+
+    def quantiles(self):
+        '''
+        Returns [(q, value)] like quantiles(), or [] before any value.
+        '''
+        if not self.seen:
+            return []
+        result = [(q, estimator.value()) for q, estimator in self.estimators]
+        return result + [(1.0, self.maximum)] if self.with_max else result
+
+
+def format_metrics(families):
+    '''
+    Renders [(name, type, help, samples)] in the Prometheus text format. Each sample is
+    (labels, value), or (labels, value, suffix) for series like a summary's _sum and _count.
+    '''
+    lines = []
+    for name, kind, description, samples in families:
+        lines.append('# HELP {} {}'.format(name, description))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for labels, value, *suffix in samples:
+            label_text = ','.join('{}="{}"'.format(key, str(val).replace('\\', r'\\').replace('"', r'\"'))
+                                  for key, val in labels.items())
+            lines.append('{}{}{} {}'.format(name, ''.join(suffix), '{' + label_text + '}' if label_text else '', float(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def summary(name, description, samples):
+    '''
+    Builds a Prometheus summary family from [(labels, StreamingSummary)].
+    '''
+    series = []
+    for labels, stream in samples:
+        series.extend((dict(labels, quantile=q), value) for q, value in stream.quantiles())
+        series.append((labels, stream.total, '_sum'))
+        series.append((labels, stream.seen, '_count'))
+    return (name, 'summary', description, series)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    '''
+    Serves the collector's output on every GET.
+    '''
+
+    def do_GET(self):
+        try:
+            body = format_metrics(self.server.collect()).encode()
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('unix', 0)
+
+
+class MetricsServer():
+    '''
+    Serves collect() in a background thread; collect returns families for format_metrics.
+    '''
+
+    def __init__(self, address, collect):
+        self.address = str(address)
+        if self.address.startswith('unix:'):
+            path = self.address[len('unix:'):]
+            if os.path.exists(path):
+                os.unlink(path)
+            self.server = UnixHTTPServer(path, MetricsHandler)
+        else:
+            self.server = ThreadingHTTPServer(('127.0.0.1', int(self.address)), MetricsHandler)
+            self.server.daemon_threads = True
+        self.server.collect = collect
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print('Serving metrics on', self.address)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.address.startswith('unix:'):
+            os.unlink(self.address[len('unix:'):])
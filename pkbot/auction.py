@@ -0,0 +1,83 @@
+'''
+Memory-mapped auction strategies produced by auction_solver.py.
+
+The file is a short JSON header followed by a float32 array of shape
+(num_pots, num_buckets, num_bids) holding the probability of each bid fraction for every
+pot size and hand bucket.
+'''
+import json
+import os
+import random
+import struct
+import eval7
+import numpy as np
+
+MAGIC = b'PKAUCT1\n'
+ALIGN = 64
+
+
+def hand_value(hand, board):
+    '''
+    Returns the eval7 value of the hand on the board, the feature auction buckets are cut on.
+    '''
+    return eval7.evaluate([eval7.Card(card) for card in hand + board])
+
+
+def write_strategy(path, strategy, pots, bid_fractions, bucket_edges, **info):
+    '''
+    Writes a (num_pots, num_buckets, num_bids) strategy array to path atomically.
+    '''
+    strategy = np.ascontiguousarray(strategy, dtype=np.float32)
+    header = {
+        'pots': list(pots),
+        'bid_fractions': list(bid_fractions),
+        'bucket_edges': [int(edge) for edge in bucket_edges],
+        'shape': list(strategy.shape),
+        'info': info,
+    }
+    blob = json.dumps(header).encode()
+    offset = -(-(len(MAGIC) + 4 + len(blob)) // ALIGN) * ALIGN
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        out.write(MAGIC)
+        out.write(struct.pack('<I', len(blob)))
+        out.write(blob)
+        out.write(b'\0' * (offset - len(MAGIC) - 4 - len(blob)))
+        out.write(strategy.tobytes())
+    os.replace(tmp_path, path)
+
+
+class AuctionStrategy():
+    '''
+    Read-only view of a solved auction strategy, memory-mapped so lookups cost microseconds.
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(path + ' is not an auction strategy file')
+            (length,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(length))
+        offset = -(-(len(MAGIC) + 4 + length) // ALIGN) * ALIGN
+        self.pots = np.array(header['pots'], dtype=np.float64)
+        self.log_pots = np.log(self.pots)
+        self.bid_fractions = header['bid_fractions']
+        self.bucket_edges = np.array(header['bucket_edges'], dtype=np.int64)
+        self.info = header['info']
+        self.table = np.memmap(path, dtype=np.float32, mode='r', offset=offset, shape=tuple(header['shape']))
+
+    def distribution(self, hand, board, pot):
+        '''
+        Returns the probabilities of each entry of bid_fractions for the hand, board and pot.
+        '''
+        bucket = int(np.searchsorted(self.bucket_edges, hand_value(hand, board), side='right'))
+        pot_idx = int(np.abs(self.log_pots - np.log(max(pot, 1))).argmin())
+        return self.table[pot_idx, bucket]
+
+    def bid(self, hand, board, pot, my_chips, rng=random):
+        '''
+        Samples a bid amount for the hand, board and pot, capped at my_chips.
+        '''
+        probs = self.distribution(hand, board, pot)
+        fraction = rng.choices(self.bid_fractions, weights=probs)[0]
+        return min(int(fraction * pot), my_chips)
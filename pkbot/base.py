@@ -10,6 +10,12 @@ class BaseBot():
     The base class for a pokerbot.
     '''
 
+    # optional pkbot.range.Range, pkbot.stats.OpponentStats and pkbot.timing.TimePlanner
+    # kept up to date by the Runner
+    opp_range = None
+    opp_stats = None
+    time_planner = None
+
     def on_hand_start(self, game_info: GameInfo, current_state: PokerState) -> None:
         '''
         Called when a new round starts. Called NUM_ROUNDS times.
@@ -36,6 +42,35 @@ class BaseBot():
         '''
         raise NotImplementedError('on_hand_end')
 
+    def opp_action_likelihood(self, game_info: GameInfo, current_state: PokerState, action) -> object:
+        '''
+        Called for every opponent action while self.opp_range is set, before the action is applied.
+        Auction bids are passed once the auction resolves, never while your own bid is pending.
+
+        Arguments:
+        game_info: the GameInfo object.
+        current_state: the PokerState object the opponent acted from.
+        action: the opponent's action.
+
+        Returns:
+        A 1326-length vector with the probability of the action for each opponent combo,
+        or None to leave the range unchanged.
+        '''
+        return None
+
+    def new_table(self) -> 'BaseBot':
+        '''
+        Called when the engine opens another table on this process (engine.py --tables).
+        Override it to share large read-only data such as models between tables.
+
+        Arguments:
+        Nothing.
+
+        Returns:
+        The bot that plays the new table, by default a fresh instance of this class.
+        '''
+        return type(self)()
+
     def get_move(self, game_info: GameInfo, current_state: PokerState) -> ActionFold | ActionCall | ActionCheck | ActionRaise | ActionBid:
         '''
         Where the magic happens - your code should implement this function.
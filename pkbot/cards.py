@@ -0,0 +1,54 @@
+'''
+Precomputed card and hole-card combo tables.
+
+Card ids follow eval7's deck order: id = 4 * rank + suit, with ranks '23456789TJQKA'
+and suits 'cdhs', so '2c' is 0 and 'As' is 51.
+'''
+from itertools import combinations
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+
+CARDS = [rank + suit for rank in RANKS for suit in SUITS]
+CARD_ID = {card: idx for idx, card in enumerate(CARDS)}
+# 64-bit masks with bit id set, by card string and by card id
+CARD_MASK = {card: 1 << idx for idx, card in enumerate(CARDS)}
+ID_MASK = [1 << idx for idx in range(52)]
+
+# every two-card holding, ordered by (low id, high id)
+COMBOS = list(combinations(range(52), 2))
+NUM_COMBOS = len(COMBOS)  # 1326
+COMBO_ID = {combo: idx for idx, combo in enumerate(COMBOS)}
+COMBO_MASK = [ID_MASK[a] | ID_MASK[b] for a, b in COMBOS]
+
+
+def card_ids(cards):
+    '''
+    Converts a list of card strings into a list of card ids.
+    '''
+    return [CARD_ID[card] for card in cards]
+
+
+def card_mask(cards):
+    '''
+    Returns the bitmask of a list of card strings or ids.
+    '''
+    mask = 0
+    for card in cards:
+        mask |= CARD_MASK[card] if isinstance(card, str) else ID_MASK[card]
+    return mask
+
+
+def mask_ids(mask):
+    '''
+    Returns the card ids set in a bitmask, in increasing order.
+    '''
+    return [idx for idx in range(52) if mask >> idx & 1]
+
+
+def combo_id(cards):
+    '''
+    Returns the combo index of a two-card holding given as strings or ids.
+    '''
+    a, b = (CARD_ID[card] if isinstance(card, str) else card for card in cards)
+    return COMBO_ID[(a, b) if a < b else (b, a)]
@@ -0,0 +1,180 @@
+'''
+Range-vs-range showdown matrices, cached per suit-isomorphic board.
+'''
+from collections import OrderedDict
+from itertools import combinations, permutations
+from math import comb
+import numpy as np
+from .cards import CARD_ID, COMBOS, COMBO_ID, COMBO_MASK, ID_MASK, NUM_COMBOS, card_mask
+from .evaluator import evaluate
+
+COMBO_CARDS = np.array(COMBOS, dtype=np.intp)  # (1326, 2)
+COMBO_BITS = np.array(COMBO_MASK, dtype=np.uint64)
+ID_BITS = np.array(ID_MASK, dtype=np.uint64)
+RUNOUT_BATCH = 64  # runouts evaluated per batch
+
+# SUIT_PERMS[p][s] is the suit that suit s is mapped to by permutation p
+SUIT_PERMS = list(permutations(range(4)))
+
+
+def _combo_perm(suit_perm):
+    '''
+    Returns the combo index of every combo after relabelling its suits.
+    '''
+    perm = np.empty(NUM_COMBOS, dtype=np.intp)
+    for idx, (a, b) in enumerate(COMBOS):
+        a = a - a % 4 + suit_perm[a % 4]
+        b = b - b % 4 + suit_perm[b % 4]
+        perm[idx] = COMBO_ID[(a, b) if a < b else (b, a)]
+    return perm
+
+
+COMBO_PERMS = [_combo_perm(suit_perm) for suit_perm in SUIT_PERMS]
+
+
+def canonical_board(board):
+    '''
+    Returns (canonical_board, perm_idx) where canonical_board is the smallest suit relabelling
+    of the board as a sorted tuple of card ids and SUIT_PERMS[perm_idx] maps the board onto it.
+    '''
+    ids = [CARD_ID[card] if isinstance(card, str) else card for card in board]
+    best = None
+    for perm_idx, suit_perm in enumerate(SUIT_PERMS):
+        key = tuple(sorted(card - card % 4 + suit_perm[card % 4] for card in ids))
+        if best is None or key < best[0]:
+            best = (key, perm_idx)
+    return best
+
+
+def live_combos(board):
+    '''
+    Returns a boolean vector marking the combos that share no card with the board.
+    '''
+    return (COMBO_BITS & np.uint64(card_mask(board))) == 0
+
+
+def showdown_matrix(board):
+    '''
+    Computes the 1326x1326 showdown matrix for a 3, 4 or 5 card board.
+
+    Entry [i, j] is P(combo i wins) - P(combo j wins) over every remaining runout, so on the
+    river it is exactly +1 (win), 0 (tie) or -1 (loss). Pairs sharing a card and combos
+    blocked by the board are 0. The flop enumerates all 1176 runouts and takes about 1.5s; the
+    turn and river take a fraction of a second.
+    '''
+    board = [CARD_ID[card] if isinstance(card, str) else card for card in board]
+    board_mask = card_mask(board)
+    live = live_combos(board)
+    deck = [card for card in range(52) if not board_mask >> card & 1]
+    runouts = np.array(list(combinations(deck, 5 - len(board))), dtype=np.intp)  # (runouts, 5 - len(board))
+    runout_bits = np.bitwise_or.reduce(ID_BITS[runouts], axis=1) | np.uint64(board_mask)
+
+    acc = np.zeros((NUM_COMBOS, NUM_COMBOS), dtype=np.int16)
+    diff = np.empty((NUM_COMBOS, NUM_COMBOS), dtype=np.int16)
+    for start in range(0, len(runouts), RUNOUT_BATCH):
+        chunk = runouts[start:start + RUNOUT_BATCH]
+        hands = np.concatenate([np.broadcast_to(np.array(board, dtype=np.intp), (len(chunk), NUM_COMBOS, len(board))),
+                                np.broadcast_to(chunk[:, None, :], (len(chunk), NUM_COMBOS, chunk.shape[1])),
+                                np.broadcast_to(COMBO_CARDS, (len(chunk), NUM_COMBOS, 2))], axis=2)
+        scores = evaluate(hands)
+        # combos that collide with a runout get the lowest score; since every live combo
+        # collides with the same number of runouts, the resulting bias cancels out in the sum
+        scores[(COMBO_BITS & runout_bits[start:start + RUNOUT_BATCH, None]) != 0] = -1
+        for runout_scores in scores:
+            ranks = np.unique(runout_scores, return_inverse=True)[1].astype(np.int16)
+            np.subtract.outer(ranks, ranks, out=diff)
+            np.sign(diff, out=diff)
+            acc += diff
+
+    matrix = acc.astype(np.float32)
+    # runouts that both holdings of a disjoint pair survive
+    matrix /= comb(len(deck) - 4, 5 - len(board))
+    matrix[~live, :] = 0.
+    matrix[:, ~live] = 0.
+    # pairs sharing a card never meet at showdown
+    for card in range(52):
+        holders = np.flatnonzero((COMBO_CARDS == card).any(axis=1))
+        matrix[np.ix_(holders, holders)] = 0.
+    return matrix
+
+
+class EquityCache():
+    '''
+    LRU cache of showdown matrices keyed by the canonical (suit-isomorphic) board.
+
+    Range weights are 1326-length vectors indexed like pkbot.cards.COMBOS.
+    '''
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.matrices = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, board):
+        '''
+        Returns (canonical_matrix, canonical_live, combo_perm) for the board, computing it on
+        a miss.
+        '''
+        key, perm_idx = canonical_board(board)
+        matrix = self.matrices.get(key)
+        if matrix is not None:
+            self.hits += 1
+            self.matrices.move_to_end(key)
+        else:
+            self.misses += 1
+            matrix = showdown_matrix(key)
+            self.matrices[key] = matrix
+            self.nbytes += matrix.nbytes
+            while self.nbytes > self.max_bytes and len(self.matrices) > 1:
+                _, evicted = self.matrices.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return matrix, live_combos(key), COMBO_PERMS[perm_idx]
+
+    def matrix(self, board):
+        '''
+        Returns the showdown matrix for the board in its own suits (a reindexed copy).
+        '''
+        matrix, _, perm = self._lookup(board)
+        return matrix[np.ix_(perm, perm)]
+
+    def hand_equities(self, opp_weights, board):
+        '''
+        Returns a 1326-length vector with the showdown equity of every combo against the
+        weighted opponent range. Combos with no compatible opponent holding get 0.
+        '''
+        matrix, live, perm = self._lookup(board)
+        opp = np.zeros(NUM_COMBOS, dtype=np.float32)
+        opp[perm] = opp_weights
+        opp *= live
+        compatible = _compatible_weight(opp)
+        ahead = matrix @ opp
+        with np.errstate(divide='ignore', invalid='ignore'):
+            equities = np.where(compatible > 0, 0.5 + 0.5 * ahead / compatible, 0.)
+        return np.where(live, equities, 0.)[perm]
+
+    def equity(self, my_weights, opp_weights, board):
+        '''
+        Returns the showdown equity of one weighted range against another.
+        '''
+        matrix, live, perm = self._lookup(board)
+        mine = np.zeros(NUM_COMBOS, dtype=np.float32)
+        opp = np.zeros(NUM_COMBOS, dtype=np.float32)
+        mine[perm] = my_weights
+        opp[perm] = opp_weights
+        mine *= live
+        opp *= live
+        total = float(mine @ _compatible_weight(opp))
+        if total <= 0.:
+            return 0.
+        return 0.5 + 0.5 * float(mine @ (matrix @ opp)) / total
+
+
+def _compatible_weight(weights):
+    '''
+    For every combo, returns the total weight of combos that share no card with it.
+    '''
+    per_card = np.bincount(COMBO_CARDS.ravel(), weights=np.repeat(weights, 2), minlength=52)
+    blocked = per_card[COMBO_CARDS[:, 0]] + per_card[COMBO_CARDS[:, 1]] - weights
+    return weights.sum() - blocked
@@ -0,0 +1,322 @@
+'''
+Batched 5 to 7 card hand evaluation with a memory-mapped lookup table.
+
+A hand's value is the larger of two lookups. Its best hand ignoring suits comes from a table
+indexed by its sorted ranks r0 <= ... <= rn-1, through the colex rank of r0 + 0 < r1 + 1 <
+... of the multiset; if five or more cards share a suit, the best flush comes from a table
+indexed by the 13-bit rank mask of that suit. Both tables are filled from eval7.evaluate, so
+every result equals eval7.evaluate on the same cards.
+
+The tables take a fraction of a second to build and are cached in a .npy file. To build the
+file ahead of time and benchmark against eval7:
+    python -m pkbot.evaluator --benchmark
+
+Enumerating a pre-flop matchup takes a third of a second, so pre-flop odds come from a second
+table with every suit-canonical matchup, estimated on the same sampled boards. It takes about
+a minute to build:
+    python -m pkbot.evaluator --preflop
+'''
+import argparse
+import os
+import time
+from itertools import chain, combinations, combinations_with_replacement, permutations
+from math import comb
+import eval7
+import numpy as np
+from .cards import CARDS
+
+TABLE_PATH = os.environ.get('PKBOT_RANK_TABLE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ranks.npy'))
+# offsets of the rank tables for 5, 6 and 7 cards and of the flush table in the file
+RANK_TABLE_SIZES = {n: comb(12 + n, n) for n in range(5, 8)}
+OFFSETS = {5: 0, 6: RANK_TABLE_SIZES[5], 7: RANK_TABLE_SIZES[5] + RANK_TABLE_SIZES[6]}
+FLUSH_OFFSET = OFFSETS[7] + RANK_TABLE_SIZES[7]
+TABLE_SIZE = FLUSH_OFFSET + 2**13
+# RANK_KEYS[i, r] is the index term of rank r as the i-th smallest rank, C(r + i, i + 1)
+RANK_KEYS = np.array([[comb(rank + i, i + 1) for rank in range(13)] for i in range(7)], dtype=np.int32)
+# suit counts packed three bits per suit, and the suit with five or more cards in each packing
+SUIT_KEYS = np.array([8**suit for suit in range(4)], dtype=np.int32)
+PREFLOP_PATH = os.environ.get('PKBOT_PREFLOP_TABLE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preflop.npy'))
+PREFLOP_BOARDS = 100000
+HOLDINGS = np.array(list(combinations(range(52), 2)), dtype=np.intp)  # all 1326 two-card hands
+SUIT_PERMUTATIONS = np.array(list(permutations(range(4))), dtype=np.intp)
+FLUSH_SUIT = np.array([next((suit for suit in range(4) if key >> 3 * suit & 7 >= 5), -1) for key in range(8**4)],
+                      dtype=np.int8)
+
+
+def build_table(path=TABLE_PATH):
+    '''
+    Fills the rank and flush tables with eval7 and writes them to path, unless path is None.
+    Returns the table.
+    '''
+    cards = [eval7.Card(card) for card in CARDS]
+    table = np.zeros(TABLE_SIZE, dtype=np.int32)
+    for n in range(5, 8):
+        for ranks in combinations_with_replacement(range(13), n):
+            if any(ranks.count(rank) > 4 for rank in set(ranks)):
+                continue
+            # cycling the suits keeps equal ranks apart and never makes a flush
+            hand = [cards[4 * rank + i % 4] for i, rank in enumerate(ranks)]
+            index = sum(comb(rank + i, i + 1) for i, rank in enumerate(ranks))
+            table[OFFSETS[n] + index] = eval7.evaluate(hand)
+    for mask in range(2**13):
+        ranks = [rank for rank in range(13) if mask >> rank & 1]
+        if len(ranks) >= 5:
+            table[FLUSH_OFFSET + mask] = eval7.evaluate([cards[4 * rank] for rank in ranks])
+    if path is not None:
+        # write next to the target and rename, so readers never see a partial file
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, table)
+        os.replace(tmp_path, path)
+    return table
+
+
+def load_table(path=TABLE_PATH, build=True):
+    '''
+    Memory-maps the table, building it first if it is missing and build is set. If the file
+    cannot be written, the built table is kept in memory instead.
+    '''
+    if not os.path.exists(path):
+        if not build:
+            raise FileNotFoundError(path)
+        try:
+            build_table(path)
+        except OSError:
+            return build_table(None)
+    return np.load(path, mmap_mode='r')
+
+
+class HandEvaluator():
+    '''
+    Evaluates whole arrays of hands at once.
+
+    Hands are int arrays of card ids (pkbot.cards.CARD_ID) with 5, 6 or 7 cards on the last
+    axis, in any order. Values are eval7.evaluate values: higher is better, equal is a tie.
+    Hands with a repeated card get a meaningless value rather than an error, so callers can
+    evaluate every combo against a board and mask out the colliding ones afterwards.
+    '''
+
+    def __init__(self, path=TABLE_PATH, build=True):
+        table = np.asarray(load_table(path, build))
+        self.rank_tables = {n: table[OFFSETS[n]:OFFSETS[n] + RANK_TABLE_SIZES[n]] for n in range(5, 8)}
+        self.flush_table = table[FLUSH_OFFSET:]
+
+    def evaluate(self, hands):
+        '''
+        Returns an int32 array with the value of every hand, shaped like hands without the
+        last axis.
+        '''
+        hands = np.asarray(hands, dtype=np.intp)
+        num_cards = hands.shape[-1]
+        # one contiguous row per card position, sorted so ranks are non-decreasing down the rows
+        cards = np.ascontiguousarray(np.sort(hands.reshape(-1, num_cards), axis=1).T)
+        ranks = cards >> 2
+        suits = cards & 3
+        index = RANK_KEYS[0][ranks[0]]
+        suit_key = SUIT_KEYS[suits[0]]
+        for i in range(1, num_cards):
+            index += RANK_KEYS[i][ranks[i]]
+            suit_key += SUIT_KEYS[suits[i]]
+        values = self.rank_tables[num_cards][index]
+        flush_suit = FLUSH_SUIT[suit_key]
+        rows = np.flatnonzero(flush_suit >= 0)
+        if len(rows):
+            suit = flush_suit[rows]
+            mask = np.zeros(len(rows), dtype=np.intp)
+            for i in range(num_cards):
+                mask |= (suits[i, rows] == suit) << ranks[i, rows]
+            values[rows] = np.maximum(values[rows], self.flush_table[mask])
+        return values.reshape(hands.shape[:-1])
+
+    def evaluate_board(self, board, holdings):
+        '''
+        Evaluates every holding (an int array (n, k) of card ids) with the same board cards.
+        '''
+        holdings = np.asarray(holdings, dtype=np.intp)
+        board = np.broadcast_to(np.asarray(board, dtype=np.intp), (len(holdings), len(board)))
+        return self.evaluate(np.concatenate([board, holdings], axis=1))
+
+
+_default = None
+
+
+def evaluate(hands):
+    '''
+    Evaluates an array of hands with a shared HandEvaluator on the default table.
+    '''
+    global _default
+    if _default is None:
+        _default = HandEvaluator()
+    return _default.evaluate(hands)
+
+
+_runout_indices = {}
+
+
+def runout_indices(num_cards, num_drawn):
+    '''
+    Returns every way to draw num_drawn of num_cards cards as an int8 array of positions.
+    '''
+    key = (num_cards, num_drawn)
+    if key not in _runout_indices:
+        flat = np.fromiter(chain.from_iterable(combinations(range(num_cards), num_drawn)), dtype=np.int8,
+                           count=comb(num_cards, num_drawn) * num_drawn)
+        _runout_indices[key] = flat.reshape(-1, num_drawn)
+    return _runout_indices[key]
+
+
+def showdown_odds(hand0, hand1, board=(), batch=200000):
+    '''
+    Enumerates every completion of the board and returns (win, tie, loss), the probabilities
+    for hand0 against hand1. Cards are ids; a pre-flop all-in enumerates 1.7M boards.
+    '''
+    hand0, hand1, board = list(hand0), list(hand1), list(board)
+    dead = set(hand0 + hand1 + board)
+    deck = np.array([card for card in range(52) if card not in dead], dtype=np.intp)
+    runouts = runout_indices(len(deck), 5 - len(board))
+    wins = ties = 0
+    for start in range(0, len(runouts), batch):
+        cards = deck[runouts[start:start + batch]]
+        boards = np.concatenate([np.broadcast_to(np.array(board, dtype=np.intp), (len(cards), len(board))), cards], axis=1)
+        values0 = evaluate(np.concatenate([boards, np.broadcast_to(np.array(hand0), (len(cards), 2))], axis=1))
+        values1 = evaluate(np.concatenate([boards, np.broadcast_to(np.array(hand1), (len(cards), 2))], axis=1))
+        wins += int(np.count_nonzero(values0 > values1))
+        ties += int(np.count_nonzero(values0 == values1))
+    total = len(runouts)
+    return wins / total, ties / total, (total - wins - ties) / total
+
+
+def matchup_keys(hands0, hands1):
+    '''
+    Returns the key of every matchup of hands0[i] against hands1[i] (int arrays (n, 2) of card
+    ids): the smallest packing of both sorted hands over the 24 relabelings of the suits, so
+    matchups that differ only by suits share a key.
+    '''
+    cards = np.concatenate([np.asarray(hands0, dtype=np.intp), np.asarray(hands1, dtype=np.intp)], axis=1)
+    cards = cards & ~3 | SUIT_PERMUTATIONS[:, cards & 3]
+    hand0 = np.sort(cards[..., :2], axis=-1)
+    hand1 = np.sort(cards[..., 2:], axis=-1)
+    return (hand0[..., 1] << 18 | hand0[..., 0] << 12 | hand1[..., 1] << 6 | hand1[..., 0]).min(axis=0)
+
+
+def build_preflop_table(path=PREFLOP_PATH, num_boards=PREFLOP_BOARDS, seed=0, batch=200):
+    '''
+    Estimates the odds of every pre-flop matchup from num_boards random boards and writes them
+    to path, unless path is None. Returns the table, rows (key, win, tie, loss) sorted by key.
+    Every board is evaluated once for all 1326 hands and shared by all matchups it misses.
+    '''
+    masks = 1 << HOLDINGS[:, 0] | 1 << HOLDINGS[:, 1]
+    first, second = np.triu_indices(len(HOLDINGS), 1)
+    disjoint = masks[first] & masks[second] == 0
+    first, second = first[disjoint], second[disjoint]
+    # one pair of hands per matchup up to suits and seats
+    keys = np.concatenate([np.minimum(matchup_keys(HOLDINGS[first[start:start + 50000]], HOLDINGS[second[start:start + 50000]]),
+                                      matchup_keys(HOLDINGS[second[start:start + 50000]], HOLDINGS[first[start:start + 50000]]))
+                           for start in range(0, len(first), 50000)])
+    _, pairs = np.unique(keys, return_index=True)
+    first, second = first[pairs], second[pairs]
+    wins, ties, losses = (np.zeros(len(pairs), dtype=np.int64) for _ in range(3))
+    boards = random_hands(num_boards, 5, seed)
+    for start in range(0, num_boards, batch):
+        board = boards[start:start + batch]
+        values = evaluate(np.concatenate([np.broadcast_to(board[:, None], (len(board), len(HOLDINGS), 5)),
+                                          np.broadcast_to(HOLDINGS, (len(board), len(HOLDINGS), 2))], axis=2))
+        # hands sharing a card with the board compare false with everything
+        values = values.astype(np.float64)
+        values[np.bitwise_or.reduce(1 << board, axis=1)[:, None] & masks != 0] = np.nan
+        values = np.ascontiguousarray(values.T)
+        values0, values1 = values[first], values[second]
+        wins += np.count_nonzero(values0 > values1, axis=1)
+        ties += np.count_nonzero(values0 == values1, axis=1)
+        losses += np.count_nonzero(values0 < values1, axis=1)
+    odds = np.stack([wins, ties, losses], axis=1) / (wins + ties + losses)[:, None]
+    forward = matchup_keys(HOLDINGS[first], HOLDINGS[second])
+    backward = matchup_keys(HOLDINGS[second], HOLDINGS[first])
+    # a matchup that is its own mirror, like AsKs against AhKh, is even
+    mirror = forward == backward
+    odds[mirror, 0] = odds[mirror, 2] = (odds[mirror, 0] + odds[mirror, 2]) / 2
+    table = np.concatenate([np.column_stack([forward, odds]), np.column_stack([backward, odds[:, ::-1]])[~mirror]])
+    table = table[np.argsort(table[:, 0])]
+    if path is not None:
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, table)
+        os.replace(tmp_path, path)
+    return table
+
+
+def load_preflop_table(path=PREFLOP_PATH, build=True):
+    '''
+    Loads the pre-flop table like load_table, building it first if it is missing and build is set.
+    '''
+    if not os.path.exists(path):
+        if not build:
+            raise FileNotFoundError(path)
+        try:
+            build_preflop_table(path)
+        except OSError:
+            return build_preflop_table(None)
+    return np.load(path)
+
+
+_preflop = None
+
+
+def preflop_odds(hand0, hand1):
+    '''
+    Returns (win, tie, loss), the probabilities for hand0 against hand1 with no board, from the
+    shared pre-flop table. Within a standard error of about 0.2% of the exact odds.
+    '''
+    global _preflop
+    if _preflop is None:
+        _preflop = load_preflop_table()
+    key = matchup_keys([hand0], [hand1])[0]
+    row = _preflop[np.searchsorted(_preflop[:, 0], key)]
+    return tuple(float(p) for p in row[1:])
+
+
+def random_hands(num_hands, num_cards=7, seed=0):
+    '''
+    Deals num_hands random hands of distinct cards.
+    '''
+    rng = np.random.default_rng(seed)
+    return np.argsort(rng.random((num_hands, 52)), axis=1)[:, :num_cards]
+
+
+def benchmark(evaluator, num_hands=1000000, num_checked=20000):
+    '''
+    Times the evaluator against a per-hand eval7 loop and checks they agree.
+    '''
+    cards = [eval7.Card(card) for card in CARDS]
+    hands = random_hands(num_hands)
+    start = time.perf_counter()
+    values = evaluator.evaluate(hands)
+    batched = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = [eval7.evaluate([cards[card] for card in hand]) for hand in hands[:num_checked].tolist()]
+    looped = (time.perf_counter() - start) * num_hands / num_checked
+    if not np.array_equal(values[:num_checked], expected):
+        raise AssertionError('lookup table disagrees with eval7')
+    print('Batched: {:.2f}M hands/s ({:.3f}s for {} 7-card hands)'.format(num_hands / batched / 1e6, batched, num_hands))
+    print('eval7 loop: {:.2f}M hands/s'.format(num_hands / looped / 1e6))
+    print('Agreement with eval7 on {} hands: 100%'.format(num_checked))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and benchmark the hand evaluation tables.')
+    parser.add_argument('--path', type=str, default=TABLE_PATH, help='Table file')
+    parser.add_argument('--rebuild', action='store_true', help='Build the table even if it exists')
+    parser.add_argument('--benchmark', action='store_true', help='Measure throughput against eval7')
+    parser.add_argument('--hands', type=int, default=1000000, help='Hands to evaluate in the benchmark')
+    parser.add_argument('--preflop', action='store_true', help='Also build the pre-flop odds table')
+    parser.add_argument('--preflop_path', type=str, default=PREFLOP_PATH, help='Pre-flop odds table file')
+    parser.add_argument('--preflop_boards', type=int, default=PREFLOP_BOARDS, help='Boards sampled for the pre-flop table')
+    args = parser.parse_args()
+    if args.rebuild or not os.path.exists(args.path):
+        start = time.perf_counter()
+        build_table(args.path)
+        print('Built {} in {:.2f}s'.format(args.path, time.perf_counter() - start))
+    if args.preflop and (args.rebuild or not os.path.exists(args.preflop_path)):
+        start = time.perf_counter()
+        build_preflop_table(args.preflop_path, args.preflop_boards)
+        print('Built {} in {:.2f}s'.format(args.preflop_path, time.perf_counter() - start))
+    if args.benchmark:
+        benchmark(HandEvaluator(args.path, build=False), args.hands)
@@ -0,0 +1,27 @@
+'''
+Tunable bot parameters, overridable from the environment for parameter sweeps.
+'''
+import json
+import os
+
+PARAMS_ENV = 'PKBOT_PARAMS'
+
+
+def load_params(defaults):
+    '''
+    Returns a copy of defaults updated with the JSON object in $PKBOT_PARAMS, if set.
+
+    Arguments:
+    defaults: a dict of parameter names to default values.
+
+    Returns:
+    A dict with the same keys. Raises KeyError for names that are not in defaults, so a
+    misspelled parameter in a sweep fails loudly instead of being ignored.
+    '''
+    params = dict(defaults)
+    overrides = json.loads(os.environ.get(PARAMS_ENV) or '{}')
+    for name, value in overrides.items():
+        if name not in params:
+            raise KeyError('unknown parameter {!r} in ${}'.format(name, PARAMS_ENV))
+        params[name] = value
+    return params
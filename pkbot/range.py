@@ -0,0 +1,60 @@
+'''
+A vectorized weight vector over the opponent's 1326 possible holdings.
+'''
+import numpy as np
+from .cards import NUM_COMBOS
+from .equity import live_combos
+
+
+class Range():
+    '''
+    Tracks the opponent's holdings as a NumPy weight vector indexed like pkbot.cards.COMBOS.
+
+    Assign one to BaseBot.opp_range and the Runner keeps it updated: it is reset and blocked by
+    your hand at the start of every hand, blocked by each new board, conditioned on the cards
+    revealed by the auction and reweighted by BaseBot.opp_action_likelihood on every opponent
+    action.
+    '''
+
+    def __init__(self, weights=None):
+        self.prior = np.ones(NUM_COMBOS) if weights is None else np.array(weights, dtype=np.float64)
+        self.weights = self.prior.copy()
+
+    def reset(self):
+        '''
+        Restores the prior weights.
+        '''
+        self.weights[:] = self.prior
+
+    def block(self, cards):
+        '''
+        Zeroes every combo that contains one of the given cards.
+        '''
+        self.weights *= live_combos(cards)
+
+    def reveal(self, cards):
+        '''
+        Keeps only the combos that contain every one of the given cards.
+        '''
+        for card in cards:
+            self.weights *= ~live_combos([card])
+
+    def update(self, likelihood):
+        '''
+        Multiplies every combo's weight by the probability of the observed action with it.
+        '''
+        self.weights *= likelihood
+
+    def total(self):
+        '''
+        Returns the total weight left in the range.
+        '''
+        return float(self.weights.sum())
+
+    def normalized(self):
+        '''
+        Returns the weights scaled to sum to 1, or all zeros if the range is empty.
+        '''
+        total = self.total()
+        return self.weights / total if total > 0. else np.zeros(NUM_COMBOS)
+
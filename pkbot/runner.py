@@ -9,6 +9,20 @@ from .states import STARTING_STACK, BIG_BLIND, SMALL_BLIND
 from .base import BaseBot
 
 
+class Table():
+    '''
+    The game tree and bot for one table served by the Runner.
+    '''
+
+    def __init__(self, pokerbot):
+        self.pokerbot = pokerbot
+        self.game_info = GameInfo(0, 0., 1)
+        self.state: GameState = None
+        self.active = 0
+        self.round_flag = True
+        self.pending_bid = None  # the opponent's auction bid, kept from the trackers until the auction resolves
+
+
 class Runner():
     '''
     Interacts with the engine.
@@ -28,9 +42,9 @@ class Runner():
                 break
             yield packet
 
-    def send(self, action):
+    def send(self, action, table_id=None):
         '''
-        Encodes an action and sends it to the engine.
+        Encodes an action and sends it to the engine, tagged with the table it is for.
         '''
         if isinstance(action, ActionFold):
             code = 'F'
@@ -42,21 +56,64 @@ class Runner():
             code = 'A' + str(action.amount)
         else:  # isinstance(action, ActionRaise)
             code = 'R' + str(action.amount)
+        if table_id is not None:
+            code = 'I' + table_id + ' ' + code
         self.socketfile.write(code + '\n')
         self.socketfile.flush()
 
+    def observe_opponent(self, pokerbot, game_info, state, active, action):
+        '''
+        Feeds an opponent action, taken from state, to the bot's trackers.
+        '''
+        opp_range = pokerbot.opp_range
+        if opp_range is not None:
+            likelihood = pokerbot.opp_action_likelihood(game_info, PokerState(state, active), action)
+            if likelihood is not None:
+                opp_range.update(likelihood)
+        if pokerbot.opp_stats is not None:
+            pokerbot.opp_stats.observe(PokerState(state, 1-active), action)
+
+    def apply_action(self, table, game_info, state, active, action):
+        '''
+        Applies an action to the game tree, first feeding opponent actions to the bot's trackers.
+        '''
+        if state.dealer % 2 != active:
+            if isinstance(action, ActionBid):
+                # the engine sends the first bid to the second bidder before it bids, but the
+                # bid is only public once the auction resolves (the N clause)
+                table.pending_bid = (game_info, state, active, action)
+            else:
+                self.observe_opponent(table.pokerbot, game_info, state, active, action)
+        return state.apply_action(action)
+
     def run(self):
         '''
         Reconstructs the game tree based on the action history received from the engine.
+
+        Messages starting with an I<table> clause belong to one of several tables served by this
+        process; each table has its own game tree and bot, the first from pokerbot and the others
+        from pokerbot.new_table().
         '''
-        game_info = GameInfo(0, 0., 1)
-        state: GameState = None
-        active = 0
-        round_flag = True
+        tables = {}
         for packet in self.receive():
+            table_id = None
+            if packet[0][:1] == 'I':
+                table_id = packet[0][1:]
+                packet = packet[1:]
+                if packet == ['Q']:  # the table is closed, the process keeps serving the others
+                    tables.pop(table_id, None)
+                    continue
+            table = tables.get(table_id)
+            if table is None:
+                table = tables[table_id] = Table(self.pokerbot if not tables else self.pokerbot.new_table())
+            pokerbot = table.pokerbot
+            game_info, state, active, round_flag = table.game_info, table.state, table.active, table.round_flag
             for clause in packet:
                 if clause[0] == 'T':
                     game_info = GameInfo(game_info.bankroll, float(clause[1:]), game_info.round_num)
+                elif clause[0] == 'G':  # a resumed match: the round to play next and the bankroll so far
+                    round_num, bankroll = clause[1:].split(',')
+                    game_info = GameInfo(int(bankroll), game_info.time_bank, int(round_num))
                 elif clause[0] == 'P':
                     active = int(clause[1:])
                 elif clause[0] == 'H':
@@ -65,29 +122,39 @@ class Runner():
                     wagers = [SMALL_BLIND, BIG_BLIND]
                     chips = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
                     state = GameState(0, 0, False, [None, None], wagers, chips, hands, [[], []], [], None)
+                    if pokerbot.opp_range is not None:
+                        pokerbot.opp_range.reset()
+                        pokerbot.opp_range.block(hands[active])
                     if round_flag:
-                        self.pokerbot.on_hand_start(game_info, PokerState(state, active))
+                        pokerbot.on_hand_start(game_info, PokerState(state, active))
                         round_flag = False
                 elif clause[0] == 'F':
-                    state = state.apply_action(ActionFold())
+                    state = self.apply_action(table, game_info, state, active, ActionFold())
                 elif clause[0] == 'C':
-                    state = state.apply_action(ActionCall())
+                    state = self.apply_action(table, game_info, state, active, ActionCall())
                 elif clause[0] == 'K':
-                    state = state.apply_action(ActionCheck())
+                    state = self.apply_action(table, game_info, state, active, ActionCheck())
                 elif clause[0] == 'R':
-                    state = state.apply_action(ActionRaise(int(clause[1:])))
+                    state = self.apply_action(table, game_info, state, active, ActionRaise(int(clause[1:])))
                 elif clause[0] == 'A': 
-                    state = state.apply_action(ActionBid(int(clause[1:])))
+                    state = self.apply_action(table, game_info, state, active, ActionBid(int(clause[1:])))
                 elif clause[0] == 'N':
                     hands = [[], []]
                     chips, bids, opp_hands = clause[1:].split('_')
+                    if table.pending_bid is not None:
+                        self.observe_opponent(pokerbot, *table.pending_bid)
+                        table.pending_bid = None
                     bids = [int(x) for x in bids.split(',')]
                     chips = [int(x) for x in chips.split(',')]
                     hands[active] = [card for card in opp_hands.split(',') if card != '']
+                    if pokerbot.opp_range is not None:
+                        pokerbot.opp_range.reveal(hands[active])
                     state = GameState(state.dealer, state.street, state.auction, bids, state.wagers, chips, state.hands, hands, state.community_cards, state)
                 elif clause[0] == 'B':
                     state = GameState(state.dealer, state.street, state.auction, state.bids, state.wagers, state.chips,
                                              state.hands, state.opp_hands, clause[1:].split(','), state.parent_state)
+                    if pokerbot.opp_range is not None:
+                        pokerbot.opp_range.block(state.community_cards)
                 elif clause[0] == 'O':
                     # backtrack
                     state = state.parent_state
@@ -106,17 +173,25 @@ class Runner():
                     payoffs[active] = delta
                     state = HandResult(payoffs, state.bids, state.parent_state)
                     game_info = GameInfo(game_info.bankroll + delta, game_info.time_bank, game_info.round_num)
-                    self.pokerbot.on_hand_end(game_info, PokerState(state, active))
+                    if pokerbot.opp_stats is not None:
+                        pokerbot.opp_stats.end_hand()
+                    if pokerbot.time_planner is not None:
+                        pokerbot.time_planner.end_hand()
+                    pokerbot.on_hand_end(game_info, PokerState(state, active))
                     game_info = GameInfo(game_info.bankroll, game_info.time_bank, game_info.round_num + 1)
                     round_flag = True
                 elif clause[0] == 'Q':
                     return
+            table.game_info, table.state, table.active, table.round_flag = game_info, state, active, round_flag
             if round_flag:  # ack the engine
-                self.send(ActionCheck())
+                action = ActionCheck()
             else:
                 assert active == state.dealer % 2
-                action = self.pokerbot.get_move(game_info, PokerState(state, active))
-                self.send(action)
+                current_state = PokerState(state, active)
+                if pokerbot.time_planner is not None:
+                    pokerbot.time_planner.start_decision(game_info, current_state)
+                action = pokerbot.get_move(game_info, current_state)
+            self.send(action, table_id)
 
 def parse_args():
     '''
@@ -3,6 +3,7 @@ Encapsulates game and round state information for the player.
 '''
 from collections import namedtuple
 from .actions import ActionFold, ActionCall, ActionCheck, ActionRaise, ActionBid
+from .cards import CARD_ID, card_mask
 
 GameInfo = namedtuple('GameInfo', ['bankroll', 'time_bank', 'round_num'])
 HandResult = namedtuple('HandResult', ['payoffs', 'bids', 'parent_state'])
@@ -129,6 +130,12 @@ class PokerState:
     my_hand: list[str]
     board: list[str]
     opp_revealed_cards: list[str]
+    my_hand_ids: list[int]
+    board_ids: list[int]
+    opp_revealed_ids: list[int]
+    my_hand_mask: int
+    board_mask: int
+    opp_revealed_mask: int
     my_chips: int
     opp_chips: int
     my_wager: int
@@ -149,6 +156,14 @@ class PokerState:
         self.my_hand = current_state.hands[active]
         self.board = current_state.community_cards
         self.opp_revealed_cards = current_state.opp_hands[active]
+
+        # the same cards as ids 0-51 and 64-bit masks, see pkbot.cards
+        self.my_hand_ids = [CARD_ID[card] for card in self.my_hand]
+        self.board_ids = [CARD_ID[card] for card in self.board]
+        self.opp_revealed_ids = [CARD_ID[card] for card in self.opp_revealed_cards]
+        self.my_hand_mask = card_mask(self.my_hand)
+        self.board_mask = card_mask(self.board)
+        self.opp_revealed_mask = card_mask(self.opp_revealed_cards)
         
         self.my_chips = current_state.chips[active]
         self.opp_chips = current_state.chips[1-active]
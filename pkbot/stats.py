@@ -0,0 +1,191 @@
+'''
+Streaming opponent statistics with constant memory and constant-time reads.
+'''
+from .actions import ActionFold, ActionCall, ActionCheck, ActionRaise, ActionBid
+
+STREETS = ['pre-flop', 'flop', 'turn', 'river']
+ACTIONS = [ActionFold, ActionCall, ActionCheck, ActionRaise]
+# facing-bet buckets as a fraction of the pot: no bet, up to half pot, up to pot, overbet
+FACING_LIMITS = [0., 0.5, 1.]
+BID_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+
+def facing_bucket(cost_to_call, pot):
+    '''
+    Returns the facing-bet bucket of a bet of cost_to_call into pot.
+    '''
+    if cost_to_call <= 0:
+        return 0
+    fraction = cost_to_call / max(pot - cost_to_call, 1)
+    for bucket, limit in enumerate(FACING_LIMITS[1:], 1):
+        if fraction <= limit:
+            return bucket
+    return len(FACING_LIMITS)
+
+
+class P2Quantile():
+    '''
+    Estimates one quantile of a stream with the P-square algorithm (five markers).
+    '''
+
+    def __init__(self, q):
+        self.q = q
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x):
+        '''
+        Adds one observation.
+        '''
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(x)
+            heights.sort()
+            return
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in range(1, 4):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                # piecewise-parabolic prediction, falling back to linear if it leaves the bracket
+                h = heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+                    (positions[i] - positions[i - 1] + d) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+                    + (positions[i + 1] - positions[i] - d) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+                if not heights[i - 1] < h < heights[i + 1]:
+                    h = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = h
+                positions[i] += d
+
+    def value(self):
+        '''
+        Returns the current estimate, or None before any observation.
+        '''
+        heights = self.heights
+        if not heights:
+            return None
+        if len(heights) < 5:
+            return heights[min(int(self.q * len(heights)), len(heights) - 1)]
+        return heights[2]
+
+
+class OpponentStats():
+    '''
+    Fixed-size opponent action counters and exponentially decayed action rates, keyed by
+    street, the opponent's position (is_bb) and the size of the bet they were facing, plus
+    streaming quantiles of the opponent's auction bids.
+
+    Assign one to BaseBot.opp_stats and the Runner feeds it every opponent action.
+    '''
+
+    def __init__(self, half_life=100):
+        self.decay = 0.5 ** (1 / half_life)  # per hand
+        num_cells = len(STREETS) * 2 * (len(FACING_LIMITS) + 1)
+        self.counts = [[0] * len(ACTIONS) for _ in range(num_cells)]
+        self.decayed = [[0.] * len(ACTIONS) for _ in range(num_cells)]
+        self.last_hand = [0] * num_cells
+        self.num_hands = 0
+        self.num_bids = 0
+        self.bid_sum = 0
+        self.bid_quantiles = [P2Quantile(q) for q in BID_QUANTILES]
+
+    def _cells(self, street, is_bb, facing):
+        '''
+        Yields the cell indices matching a street and optional position and facing bucket.
+        '''
+        num_facing = len(FACING_LIMITS) + 1
+        base = STREETS.index(street) * 2 * num_facing
+        for pos in ((0, 1) if is_bb is None else (int(is_bb),)):
+            for bucket in (range(num_facing) if facing is None else (facing,)):
+                yield base + pos * num_facing + bucket
+
+    def observe(self, current_state, action):
+        '''
+        Records an opponent action. current_state is the PokerState from the opponent's side.
+        '''
+        if isinstance(action, ActionBid):
+            self.observe_bid(action.amount)
+            return
+        facing = facing_bucket(current_state.cost_to_call, current_state.pot)
+        cell = next(self._cells(current_state.street, current_state.is_bb, facing))
+        idx = ACTIONS.index(type(action))
+        self.counts[cell][idx] += 1
+        decayed = self.decayed[cell]
+        scale = self.decay ** (self.num_hands - self.last_hand[cell])
+        for i in range(len(ACTIONS)):
+            decayed[i] *= scale
+        decayed[idx] += 1.
+        self.last_hand[cell] = self.num_hands
+
+    def observe_bid(self, amount):
+        '''
+        Records an opponent auction bid.
+        '''
+        self.num_bids += 1
+        self.bid_sum += amount
+        for quantile in self.bid_quantiles:
+            quantile.add(amount)
+
+    def end_hand(self):
+        '''
+        Advances the decay clock by one hand.
+        '''
+        self.num_hands += 1
+
+    def count(self, action_cls, street, is_bb=None, facing=None):
+        '''
+        Returns how many times the opponent took the action in the matching spots.
+        '''
+        idx = ACTIONS.index(action_cls)
+        return sum(self.counts[cell][idx] for cell in self._cells(street, is_bb, facing))
+
+    def frequency(self, action_cls, street, is_bb=None, facing=None, default=0.):
+        '''
+        Returns the all-time fraction of the opponent's actions in the matching spots that
+        were action_cls, or default if there are none.
+        '''
+        idx = ACTIONS.index(action_cls)
+        hits = total = 0
+        for cell in self._cells(street, is_bb, facing):
+            hits += self.counts[cell][idx]
+            total += sum(self.counts[cell])
+        return hits / total if total else default
+
+    def rate(self, action_cls, street, is_bb=None, facing=None, default=0.):
+        '''
+        Like frequency, but with every observation weighted down by its age in hands.
+        '''
+        idx = ACTIONS.index(action_cls)
+        hits = total = 0.
+        for cell in self._cells(street, is_bb, facing):
+            scale = self.decay ** (self.num_hands - self.last_hand[cell])
+            hits += self.decayed[cell][idx] * scale
+            total += sum(self.decayed[cell]) * scale
+        return hits / total if total > 0. else default
+
+    def bid_quantile(self, q):
+        '''
+        Returns the estimated q-quantile of the opponent's bids; q must be in BID_QUANTILES.
+        '''
+        return self.bid_quantiles[BID_QUANTILES.index(q)].value()
+
+    def mean_bid(self):
+        '''
+        Returns the opponent's mean bid, or None before the first auction.
+        '''
+        return self.bid_sum / self.num_bids if self.num_bids else None
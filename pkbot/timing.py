@@ -0,0 +1,93 @@
+'''
+Per-decision time budgets and an anytime loop for iterative computation.
+'''
+import time
+from .states import NUM_ROUNDS, BIG_BLIND
+
+STREET_WEIGHTS = {'pre-flop': 0.5, 'flop': 1., 'auction': 1., 'turn': 1.25, 'river': 1.5}
+
+
+class TimePlanner():
+    '''
+    Splits the remaining time bank over the decisions still to come in the match.
+
+    The number of decisions left is estimated from the rounds left and the decisions per hand
+    seen so far. Each decision's share is scaled by its street and by the size of the pot, so
+    big river decisions get more time than pre-flop ones.
+
+    Assign one to BaseBot.time_planner and the Runner calls start_decision before every
+    get_move, so the bot only needs to read self.time_planner.deadline.
+    '''
+
+    def __init__(self, num_rounds=NUM_ROUNDS, reserve=1., max_decision_time=1., pot_exponent=0.5,
+                 street_weights=STREET_WEIGHTS):
+        self.num_rounds = num_rounds
+        self.reserve = reserve  # seconds of the time bank never planned
+        self.max_decision_time = max_decision_time
+        self.pot_exponent = pot_exponent
+        self.street_weights = street_weights
+        self.hands = 0
+        self.decisions = 0
+        self.total_weight = 0.
+        self.budget = 0.
+        self.deadline = time.perf_counter()
+
+    def weight(self, current_state):
+        '''
+        Returns the relative importance of a decision.
+        '''
+        pot_factor = (max(current_state.pot, 2 * BIG_BLIND) / (2 * BIG_BLIND)) ** self.pot_exponent
+        return self.street_weights.get(current_state.street, 1.) * pot_factor
+
+    def start_decision(self, game_info, current_state):
+        '''
+        Records a decision and sets budget (seconds) and deadline (a time.perf_counter() value).
+        '''
+        start = time.perf_counter()
+        weight = self.weight(current_state)
+        self.decisions += 1
+        self.total_weight += weight
+        # until a few hands are done, assume four decisions per hand of average weight
+        hands = max(self.hands, 1)
+        decisions_per_hand = self.decisions / hands if self.hands >= 5 else 4.
+        mean_weight = self.total_weight / self.decisions
+        rounds_left = max(self.num_rounds - game_info.round_num + 1, 1)
+        weight_left = rounds_left * decisions_per_hand * mean_weight
+        available = max(game_info.time_bank - self.reserve, 0.)
+        self.budget = min(available * weight / weight_left, self.max_decision_time)
+        self.deadline = start + self.budget
+        return self.deadline
+
+    def end_hand(self):
+        '''
+        Counts a finished hand.
+        '''
+        self.hands += 1
+
+    def remaining(self):
+        '''
+        Returns the seconds left until the current deadline.
+        '''
+        return self.deadline - time.perf_counter()
+
+
+def anytime(step, deadline, result=None, min_steps=1, max_steps=None):
+    '''
+    Runs result = step(result) until the next step would likely overrun the deadline, and
+    returns the last result. At least min_steps steps run, even past the deadline.
+
+    Example, Monte Carlo batches accumulated as (wins, trials):
+        wins, trials = anytime(lambda acc: add(acc, simulate(100)), planner.deadline, (0, 0))
+    '''
+    steps = 0
+    slowest = 0.
+    now = time.perf_counter()
+    while max_steps is None or steps < max_steps:
+        if steps >= min_steps and now + slowest > deadline:
+            break
+        result = step(result)
+        steps += 1
+        end = time.perf_counter()
+        slowest = max(slowest, end - now)
+        now = end
+    return result
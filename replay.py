@@ -0,0 +1,301 @@
+'''
+Replays the decision points of recorded matches into a bot, in process.
+
+The engine's messages to one seat are rebuilt from a game log and fed to the bot through the
+pkbot Runner, exactly as in a match, so GameInfo, PokerState and any trackers on the bot are
+reconstructed at every decision. The hand always follows the recorded actions; the bot's
+answers are only compared against them and timed.
+
+Usage: python replay.py --bot ./bot.py logs/*.glog --name BotA
+'''
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import time
+
+import eval7
+
+from engine import GameState, HandResult, PokerMatch, DECODE_ACTION, GAME_CLOCK, STARTING_STACK, SMALL_BLIND, BIG_BLIND
+from metrics import quantiles
+from results_db import ROUND_LINE, ACTION
+
+BOARD_LINE = re.compile(r'(?:Flop|Turn|River) \[(.*)\], ')
+CARDS_LINE = re.compile(r'(?: received |: )\[(.*)\]$')
+REVEAL_LINE = re.compile(r' won the auction and was revealed \[(.*)\]$')
+PAYOFF_LINE = re.compile(r'(?: awarded |: )([+-]?\d+)$')
+PHRASE_CODES = {'folds': 'F', 'calls': 'C', 'checks': 'K'}
+
+
+def action_code(match):
+    '''
+    Turns a results_db.ACTION match on a full or small log action into its engine code.
+    '''
+    text = match.group(0)
+    if text in PHRASE_CODES:
+        return PHRASE_CODES[text]
+    if match.group(1) is not None or match.group(4) is not None:
+        return 'A' + (match.group(1) or match.group(4))
+    if match.group(2) or match.group(3) or match.group(5):
+        return 'R' + (match.group(2) or match.group(3) or match.group(5))
+    return text
+
+
+def parse_hands(path):
+    '''
+    Parses a full or small .glog file into (bot names, hands). Each hand is a dict with round,
+    players ([sb, bb]), hands, reveals and payoffs (by name), board and actions, a list of
+    (name, code, timed_out) where timed_out marks actions the engine chose for a bot whose
+    time bank had run out.
+    '''
+    with open(path) as log_file:
+        lines = log_file.read().split('\n')
+    names = lines[0][20:].split(' vs ')
+    hands = []
+    hand = None
+    timed_out = set()
+    for line in lines[1:]:
+        match = ROUND_LINE.match(line)
+        if match:
+            hand = {'round': int(match.group(1)), 'players': [match.group(2), match.group(4)], 'hands': {},
+                    'board': [], 'reveals': {}, 'actions': [], 'payoffs': {}}
+            hands.append(hand)
+            continue
+        if hand is None or not line:
+            continue
+        match = BOARD_LINE.match(line)
+        if match:
+            hand['board'] = match.group(1).split()
+            continue
+        name = next((name for name in hand['players'] if line.startswith(name)
+                     and line[len(name):][:1] in (' ', ':')), None)
+        if name is None:
+            continue
+        rest = line[len(name):]
+        if rest == ' ran out of time':
+            timed_out.add(name)
+        elif match := REVEAL_LINE.fullmatch(rest):
+            hand['reveals'][name] = match.group(1).split()
+        elif (match := CARDS_LINE.fullmatch(rest)) and name not in hand['hands']:
+            hand['hands'][name] = match.group(1).split()
+        elif match := PAYOFF_LINE.fullmatch(rest):
+            hand['payoffs'][name] = int(match.group(1))
+        elif match := ACTION.fullmatch(rest[1:]):
+            hand['actions'].append((name, action_code(match), name in timed_out))
+    return names, hands
+
+
+class LoggedBoard():
+    '''
+    Stands in for the engine's deck, dealing the recorded board.
+    '''
+    rng = random  # auction reveals are overwritten with the recorded cards
+
+    def __init__(self, cards):
+        self.cards = [eval7.Card(card) for card in cards]
+
+    def peek(self, num):
+        return self.cards[:num]
+
+
+class Seat():
+    def __init__(self, name):
+        self.name = name
+
+
+def decision_points(hand, name, match):
+    '''
+    Replays one recorded hand through the engine's GameState and message building, and returns
+    the queries sent to the named bot as (clauses, recorded code or None) pairs. The time bank
+    clause is left out; acks at the end of the hand have no recorded code.
+    '''
+    players = [Seat(player) for player in hand['players']]
+    seat = hand['players'].index(name)
+    cards = [[eval7.Card(card) for card in hand['hands'][player]] for player in hand['players']]
+    state = GameState(0, 0, False, [None, None], [SMALL_BLIND, BIG_BLIND],
+                      [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND], cards, [[], []],
+                      LoggedBoard(hand['board']), None)
+    match.log = []
+    queries = []
+    for actor, code, timed_out in hand['actions']:
+        match.log_state(players, state)
+        active = state.dealer % 2
+        if hand['players'][active] != actor:
+            raise ValueError('round {}: expected {} to act, log has {}'.format(hand['round'], hand['players'][active], actor))
+        if active == seat:
+            queries.append((match.player_messages[active][1:], None if timed_out else code))
+        del match.player_messages[active][1:]
+        action = DECODE_ACTION[code[0]](int(code[1:])) if code[0] in 'RA' else DECODE_ACTION[code]()
+        match.log_action(actor, action, state.wagers == [0, 0])
+        previous_auction = state.auction
+        state = state.apply_action(action)
+        if previous_auction and not isinstance(state, HandResult) and not state.auction:
+            # the engine picks the revealed cards at random; use the recorded ones
+            for i, player in enumerate(hand['players']):
+                state.opp_hands[i][:] = [eval7.Card(card) for card in hand['reveals'].get(player, [])]
+    if not isinstance(state, HandResult):
+        raise ValueError('round {}: the log ends before the hand does'.format(hand['round']))
+    match.log_result(players, state)
+    if hand['payoffs'] and state.payoffs[seat] != hand['payoffs'].get(name):
+        raise ValueError('round {}: replayed payoff {} does not match the log'.format(hand['round'], state.payoffs[seat]))
+    queries.append((match.player_messages[seat][1:], None))
+    return queries
+
+
+class ReplaySocket():
+    '''
+    The socket file seen by the Runner: serves the rebuilt messages with a live time bank and
+    times each answer from the moment its message is read.
+    '''
+
+    def __init__(self, queries, time_bank=GAME_CLOCK):
+        self.queries = iter(queries)
+        self.time_bank = time_bank
+        self.current = None
+        self.start_time = 0.
+        self.state = None  # the GameInfo and PokerState of the pending decision
+        self.decisions = []
+
+    def readline(self):
+        self.current = next(self.queries, None)
+        if self.current is None:
+            return 'Q\n'
+        clauses, _ = self.current
+        self.start_time = time.perf_counter()
+        return ' '.join(['T{:.3f}'.format(self.time_bank)] + clauses) + '\n'
+
+    def write(self, text):
+        latency = time.perf_counter() - self.start_time
+        self.time_bank -= latency
+        _, recorded = self.current
+        if self.state is None:  # an ack, not a decision
+            return
+        game_info, current_state = self.state
+        self.state = None
+        self.decisions.append({
+            'round': game_info.round_num,
+            'street': current_state.street,
+            'hand': list(current_state.my_hand),
+            'board': list(current_state.board),
+            'revealed': list(current_state.opp_revealed_cards),
+            'pot': current_state.pot,
+            'cost_to_call': current_state.cost_to_call,
+            'time_bank': game_info.time_bank,
+            'recorded': recorded,
+            'replayed': text.strip(),
+            'latency': latency,
+        })
+
+    def flush(self):
+        pass
+
+
+@contextlib.contextmanager
+def bot_folder(path):
+    '''
+    Runs the block from the folder of a bot file, as the engine runs bots, and then returns to
+    the previous working directory.
+    '''
+    previous = os.getcwd()
+    os.chdir(os.path.dirname(path))
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def load_bot(path):
+    '''
+    Imports a bot file and returns a new Player. Call it inside bot_folder(path), so relative
+    paths the bot opens resolve the way they do in a match.
+    '''
+    folder = os.path.dirname(path)
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+    spec = importlib.util.spec_from_file_location('replayed_bot', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Player()
+
+
+def replay_log(bot_path, log_path, name=None, max_hands=None):
+    '''
+    Replays one game log into a fresh instance of the bot and returns its decision records.
+    '''
+    from pkbot.runner import Runner
+    names, hands = parse_hands(log_path)
+    name = name or names[0]
+    if name not in names:
+        raise ValueError('{} is not in {} ({})'.format(name, log_path, ' vs '.join(names)))
+    match = PokerMatch(small_log=True, bots=[(names[0], ''), (names[1], '')])
+    queries = []
+    for hand in hands[:max_hands]:
+        queries.extend(decision_points(hand, name, match))
+
+    socketfile = ReplaySocket(queries)
+    with bot_folder(bot_path):
+        bot = load_bot(bot_path)
+        get_move = bot.get_move
+
+        def timed_get_move(game_info, current_state):
+            socketfile.state = (game_info, current_state)
+            return get_move(game_info, current_state)
+        bot.get_move = timed_get_move
+        Runner(bot, socketfile).run()
+    for decision in socketfile.decisions:
+        decision['log'] = os.path.basename(log_path)
+    return socketfile.decisions
+
+
+def report(decisions, worst=10):
+    '''
+    Prints action agreement, latency percentiles and the slowest and disagreeing decisions.
+    '''
+    compared = [d for d in decisions if d['recorded'] is not None]
+    exact = sum(d['replayed'] == d['recorded'] for d in compared)
+    same_kind = sum(d['replayed'][:1] == d['recorded'][:1] for d in compared)
+    latencies = [d['latency'] for d in decisions]
+    print('Decisions: {} ({} compared with the log)'.format(len(decisions), len(compared)))
+    if compared:
+        print('Same action: {:.1%}   same action type: {:.1%}'.format(exact / len(compared), same_kind / len(compared)))
+    print('Latency: ' + '   '.join('p{:g} {:.2f}ms'.format(100 * q, 1000 * value) for q, value in quantiles(latencies)))
+    print('Total decision time: {:.3f}s'.format(sum(latencies)))
+
+    def describe(d):
+        return '{} round {} {} hand {} board {} pot {} to call {}: recorded {} replayed {} in {:.2f}ms'.format(
+            d['log'], d['round'], d['street'], ' '.join(d['hand']), ' '.join(d['board']) or '-', d['pot'],
+            d['cost_to_call'], d['recorded'], d['replayed'], 1000 * d['latency'])
+    print('\nSlowest decisions:')
+    for d in sorted(decisions, key=lambda d: d['latency'], reverse=True)[:worst]:
+        print('  ' + describe(d))
+    disagreements = [d for d in compared if d['replayed'] != d['recorded']]
+    if disagreements:
+        print('\nDisagreements (largest pots first):')
+        for d in sorted(disagreements, key=lambda d: d['pot'], reverse=True)[:worst]:
+            print('  ' + describe(d))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay logged decision points into a bot for regression and latency checks.')
+    parser.add_argument('logs', nargs='+', help='.glog files to replay')
+    parser.add_argument('--bot', type=str, required=True, help='Bot file to replay the decisions into')
+    parser.add_argument('--name', type=str, default=None, help='Seat to replay, by bot name (default: the first bot in each log)')
+    parser.add_argument('--hands', type=int, default=None, help='Replay only the first n hands of each log')
+    parser.add_argument('--worst', type=int, default=10, help='How many slowest and disagreeing decisions to show')
+    parser.add_argument('--out', type=str, default=None, help='Write every decision record to this JSON file')
+    args = parser.parse_args()
+
+    bot_path = os.path.abspath(args.bot)
+    log_paths = [os.path.abspath(path) for path in args.logs]
+    out_path = os.path.abspath(args.out) if args.out else None
+    decisions = []
+    for log_path in log_paths:
+        decisions.extend(replay_log(bot_path, log_path, args.name, args.hands))
+    report(decisions, args.worst)
+    if out_path:
+        with open(out_path, 'w') as out_file:
+            json.dump(decisions, out_file, indent=1)
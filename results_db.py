@@ -0,0 +1,205 @@
+'''
+SQLite index of match results and per-hand summaries.
+
+The engine writes into it directly with `python engine.py --db results.db`; existing game logs
+can be added with `python results_db.py results.db logs/*.glog`.
+
+Example query, bot X against bot Y over hands that reached the river:
+
+    SELECT COUNT(*), SUM(p.payoff) FROM hand_players p JOIN hands h USING (match_id, round)
+    WHERE p.bot = 'X' AND p.opponent = 'Y' AND h.street_reached = 5
+
+Matches run with --allin_ev also store ev_payoff, so SUM(p.ev_payoff) gives the lower-variance
+score with all-in luck removed.
+'''
+import argparse
+import os
+import re
+import sqlite3
+
+SMALL_BLIND = 10
+BIG_BLIND = 20
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS matches (
+    match_id INTEGER PRIMARY KEY,
+    started TEXT NOT NULL,
+    log_file TEXT NOT NULL UNIQUE,
+    bot_a TEXT NOT NULL,
+    bot_b TEXT NOT NULL,
+    bankroll_a INTEGER NOT NULL,
+    bankroll_b INTEGER NOT NULL,
+    num_hands INTEGER NOT NULL,
+    match_time REAL
+);
+CREATE TABLE IF NOT EXISTS hands (
+    match_id INTEGER NOT NULL REFERENCES matches(match_id),
+    round INTEGER NOT NULL,
+    street_reached INTEGER NOT NULL,    -- 0 pre-flop, 3 flop, 4 turn, 5 river
+    showdown INTEGER NOT NULL,
+    auction_winner TEXT,                -- bot name, 'tie', or NULL without an auction
+    pot INTEGER NOT NULL,
+    PRIMARY KEY (match_id, round)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hand_players (
+    match_id INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    bot TEXT NOT NULL,
+    opponent TEXT NOT NULL,
+    is_bb INTEGER NOT NULL,
+    payoff INTEGER NOT NULL,
+    bid INTEGER,
+    queries INTEGER,                    -- latency columns are NULL for ingested logs
+    query_time REAL,
+    max_query_time REAL,
+    ev_payoff REAL,                     -- all-in EV adjusted payoff, NULL unless run with --allin_ev
+    PRIMARY KEY (match_id, round, is_bb)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS matches_bots ON matches (bot_a, bot_b, started);
+CREATE INDEX IF NOT EXISTS hands_street ON hands (street_reached, match_id);
+CREATE INDEX IF NOT EXISTS hand_players_bots ON hand_players (bot, opponent, match_id);
+'''
+
+
+def connect(db_path):
+    '''
+    Opens the database, creating the schema if needed.
+    '''
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    # databases created before ev_payoff existed get it added, as the last column
+    if 'ev_payoff' not in [row[1] for row in conn.execute('PRAGMA table_info(hand_players)')]:
+        conn.execute('ALTER TABLE hand_players ADD COLUMN ev_payoff REAL')
+    return conn
+
+
+def record_match(conn, match, hands):
+    '''
+    Inserts one match and all its hand summaries in a single transaction.
+
+    match: dict with started, log_file, bots ([name_a, name_b]), bankrolls, match_time.
+    hands: list of dicts with round, players ([sb, bb] names), street, showdown, bids ([sb, bb]
+    or None), auction_winner, pot, payoffs ([sb, bb]) and optionally queries, query_time,
+    max_query_time and ev_payoffs ([sb, bb] each).
+    Returns the new match_id, or None if the log file is already indexed.
+    '''
+    with conn:
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO matches (started, log_file, bot_a, bot_b, bankroll_a, bankroll_b, num_hands, match_time) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (match['started'], match['log_file'], match['bots'][0], match['bots'][1],
+             match['bankrolls'][0], match['bankrolls'][1], len(hands), match.get('match_time')))
+        if cursor.rowcount == 0:
+            return None
+        match_id = cursor.lastrowid
+        conn.executemany(
+            'INSERT INTO hands VALUES (?, ?, ?, ?, ?, ?)',
+            [(match_id, hand['round'], hand['street'], int(hand['showdown']), hand['auction_winner'], hand['pot'])
+             for hand in hands])
+        rows = []
+        for hand in hands:
+            for seat in range(2):
+                optional = [hand[key][seat] if hand.get(key) else None
+                            for key in ('queries', 'query_time', 'max_query_time', 'ev_payoffs')]
+                rows.append((match_id, hand['round'], hand['players'][seat], hand['players'][1 - seat], seat,
+                             hand['payoffs'][seat], hand['bids'][seat] if hand['bids'] else None, *optional))
+        conn.executemany('INSERT INTO hand_players VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    return match_id
+
+
+# Game log parsing -----------------------------------------------------------------------------------
+ROUND_LINE = re.compile(r'Round #(\d+), (.+) \((-?\d+)\), (.+) \((-?\d+)\)$')
+STREET_LINE = re.compile(r'(Flop|Turn|River) \[.*\], (.+) \((\d+)\), (.+) \((\d+)\)$')
+STREETS = {'Flop': 3, 'Turn': 4, 'River': 5}
+# full and small log phrasings of an action
+ACTION = re.compile(r'folds|calls|checks|bids (\d+)|bets (\d+)|raises to (\d+)|F|C|K|A(\d+)|R(\d+)')
+
+
+def parse_game_log(path):
+    '''
+    Parses a full or small .glog file into (match, hands) for record_match.
+    '''
+    with open(path) as log_file:
+        lines = log_file.read().split('\n')
+    started, names = lines[0][:19], lines[0][20:].split(' vs ')
+    hands = []
+    hand = None
+    allin_ev = False
+    for line in lines[1:]:
+        if line.startswith('EV-adjusted, '):  # the match was run with --allin_ev
+            allin_ev = True
+            continue
+        match = ROUND_LINE.match(line)
+        if match:
+            hand = {'round': int(match.group(1)), 'players': [match.group(2), match.group(4)], 'street': 0,
+                    'showdown': True, 'bids': None, 'auction_winner': None, 'pot': SMALL_BLIND + BIG_BLIND,
+                    'payoffs': [0, 0]}
+            hands.append(hand)
+            base, wagers = [0, 0], [SMALL_BLIND, BIG_BLIND]
+            continue
+        if hand is None or not line:
+            continue
+        match = STREET_LINE.match(line)
+        if match:
+            hand['street'] = STREETS[match.group(1)]
+            base, wagers = [int(match.group(3)), int(match.group(5))], [0, 0]
+            hand['pot'] = base[0] + base[1]
+            continue
+        seat = next((i for i in range(2) if line[len(hand['players'][i]):][:1] in (' ', ':')
+                     and line.startswith(hand['players'][i])), None)
+        if seat is None:
+            continue
+        rest = line[len(hand['players'][seat]):]
+        if rest == ' won the auction' or rest.startswith(' won the auction '):
+            hand['auction_winner'] = 'tie' if hand['auction_winner'] else hand['players'][seat]
+        elif rest.startswith(' awarded ') or (rest.startswith(': ') and '[' not in rest):
+            hand['payoffs'][seat] = int(rest.split()[-1])
+        elif rest.startswith(' all-in EV '):
+            hand.setdefault('ev_payoffs', [None, None])[seat] = float(rest.split()[-1])
+        elif match := ACTION.fullmatch(rest[1:]):
+            bid = match.group(1) or match.group(4)
+            wager = match.group(2) or match.group(3) or match.group(5)
+            if rest[1:] in ('folds', 'F'):
+                hand['showdown'] = False
+            elif rest[1:] in ('calls', 'C'):
+                wagers[seat] = wagers[1 - seat]
+            elif bid is not None:
+                hand['bids'] = hand['bids'] or [0, 0]
+                hand['bids'][seat] = int(bid)
+            elif wager is not None:
+                wagers[seat] = int(wager)
+            hand['pot'] = base[0] + base[1] + wagers[0] + wagers[1]
+    if allin_ev:
+        for hand in hands:
+            hand.setdefault('ev_payoffs', list(hand['payoffs']))
+    bankrolls = [0, 0]
+    for hand in hands:
+        for seat in range(2):
+            bankrolls[names.index(hand['players'][seat])] += hand['payoffs'][seat]
+    match = {'started': started, 'log_file': os.path.basename(path), 'bots': names, 'bankrolls': bankrolls}
+    return match, hands
+
+
+def ingest(db_path, paths):
+    '''
+    Indexes game logs, one transaction per log; already indexed logs are skipped.
+    '''
+    conn = connect(db_path)
+    added = 0
+    for path in paths:
+        match, hands = parse_game_log(path)
+        if record_match(conn, match, hands) is not None:
+            added += 1
+    conn.close()
+    return added
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index game logs into a SQLite database.')
+    parser.add_argument('db', type=str, help='Database file')
+    parser.add_argument('logs', nargs='+', help='.glog files to ingest')
+    args = parser.parse_args()
+    added = ingest(args.db, args.logs)
+    print('Indexed {} of {} logs into {}'.format(added, len(args.logs), args.db))
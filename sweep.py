@@ -0,0 +1,177 @@
+'''
+Parameter sweep with successive halving on common random numbers.
+
+One bot file is played with many parameter configurations against a fixed opponent. Each
+configuration reaches the bot as a JSON object in $PKBOT_PARAMS (read it with
+pkbot.params.load_params). Every configuration plays the same seeded matches, so hand k of a
+match deals the same cards to every variant and results are compared hand by hand.
+
+After each rung, configurations significantly behind the leader on those paired hands are
+dropped, then only the best 1/eta continue. Each rung plays eta times more matches than the
+one before, so most of the compute goes to the contenders.
+
+Usage: python sweep.py --bot ./my_bot.py --grid bid_fraction=0.1,0.25,0.5 --grid aggression=1,2
+'''
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import math
+import os
+import tempfile
+import time
+from multiprocessing import Pool
+
+from config import *
+from pkbot.params import PARAMS_ENV
+
+SWEEP_NAME = 'Sweep'
+OPPONENT_NAME = 'Opponent'
+
+
+def parse_value(text):
+    '''
+    Reads a grid value as JSON, falling back to a plain string.
+    '''
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def make_configs(grid, configs_path=None):
+    '''
+    Returns the list of parameter dicts from --grid name=v1,v2 options and a JSON file holding a
+    list of parameter dicts. Grid options are crossed with each other and with the file entries.
+    '''
+    base = [{}]
+    if configs_path is not None:
+        with open(configs_path) as configs_file:
+            base = json.load(configs_file)
+    axes = []
+    for option in grid:
+        name, values = option.split('=', 1)
+        axes.append([(name, parse_value(value)) for value in values.split(',')])
+    return [dict(config, **dict(choice)) for config in base for choice in itertools.product(*axes)]
+
+
+def play_match(job):
+    '''
+    Plays one seeded match of a configuration against the opponent, in a pool worker.
+    Returns (config index, per-hand payoffs of the configuration, timeouts + illegal actions).
+    '''
+    from engine import PokerMatch
+    index, params, bot_file, opponent_file, seed, mirrored, use_ev = job
+    bots = [(SWEEP_NAME, bot_file), (OPPONENT_NAME, opponent_file)]
+    env = [{PARAMS_ENV: json.dumps(params)}, None]
+    if mirrored:
+        bots, env = bots[::-1], env[::-1]
+    with tempfile.TemporaryDirectory() as log_folder, contextlib.redirect_stdout(io.StringIO()):
+        match = PokerMatch(small_log=True, bots=bots, log_folder=log_folder, env=env, seed=seed, allin_ev=use_ev)
+        result = match.run()
+    key = 'ev_payoffs' if use_ev else 'payoffs'
+    payoffs = [hand[key][hand['players'].index(SWEEP_NAME)] for hand in match.hand_summaries]
+    errors = sum(bot['timeouts'] + bot['illegal_actions'] for bot in result['bots'] if bot['name'] == SWEEP_NAME)
+    return index, payoffs, errors
+
+
+def paired_gap(payoffs, leader_payoffs):
+    '''
+    Returns (mean, standard error) of the per-hand payoff difference to the leader.
+    '''
+    n = len(payoffs)
+    diffs = [a - b for a, b in zip(payoffs, leader_payoffs)]
+    mean = sum(diffs) / n
+    var = sum((d - mean) ** 2 for d in diffs) / max(n - 1, 1)
+    return mean, math.sqrt(var / n)
+
+
+def run_sweep(args):
+    configs = make_configs(args.grid, args.configs)
+    if not configs or configs == [{}]:
+        raise SystemExit('No configurations given; use --grid and/or --configs')
+    bot_file = os.path.abspath(args.bot)
+    opponent_file = os.path.abspath(args.opponent)
+    payoffs = {index: [] for index in range(len(configs))}
+    errors = {index: 0 for index in range(len(configs))}
+    eliminated = {}
+    alive = list(range(len(configs)))
+    start_time = time.perf_counter()
+    if args.allin_ev:
+        from engine import ensure_preflop_table
+        ensure_preflop_table()  # once here rather than in every worker
+    with Pool(args.workers) as pool:
+        for rung in range(args.max_rungs):
+            seeds = ['{}-{}-{}'.format(args.seed, rung, m) for m in range(args.matches * args.eta ** rung)]
+            orientations = [False, True] if args.mirror else [False]
+            jobs = [(index, configs[index], bot_file, opponent_file, seed, mirrored, args.allin_ev)
+                    for seed in seeds for mirrored in orientations for index in alive]
+            print('Rung {}: {} configurations x {} matches'.format(rung, len(alive), len(seeds) * len(orientations)))
+            # imap keeps job order, so every configuration's payoffs line up hand by hand
+            for index, match_payoffs, match_errors in pool.imap(play_match, jobs):
+                payoffs[index].extend(match_payoffs)
+                errors[index] += match_errors
+
+            means = {index: sum(payoffs[index]) / len(payoffs[index]) for index in alive}
+            leader = max(alive, key=means.get)
+            survivors = []
+            for index in alive:
+                gap, se = paired_gap(payoffs[index], payoffs[leader])
+                if index != leader and gap + args.z * se < 0:
+                    eliminated[index] = rung
+                else:
+                    survivors.append(index)
+            survivors.sort(key=means.get, reverse=True)
+            keep = max(1, math.ceil(len(alive) / args.eta))
+            for index in survivors[keep:]:
+                eliminated[index] = rung
+            alive = survivors[:keep]
+            for index in sorted(means, key=means.get, reverse=True):
+                print('  #{:<3} {:+8.2f}/hand {}{}'.format(index, means[index], json.dumps(configs[index]),
+                                                           '' if index in alive else '  (out)'))
+            if len(alive) == 1:
+                break
+
+    leader = max(alive, key=lambda index: sum(payoffs[index]) / len(payoffs[index]))
+    standings = []
+    for index, config in enumerate(configs):
+        gap, se = paired_gap(payoffs[index], payoffs[leader])
+        standings.append({
+            'config': index,
+            'params': config,
+            'hands': len(payoffs[index]),
+            'mean_payoff': sum(payoffs[index]) / len(payoffs[index]),
+            'gap_to_leader': gap,
+            'gap_stderr': se,
+            'eliminated_at_rung': eliminated.get(index),
+            'timeouts_and_illegal_actions': errors[index],
+        })
+    standings.sort(key=lambda row: (row['eliminated_at_rung'] is not None, -(row['eliminated_at_rung'] or 0),
+                                    -row['mean_payoff']))
+    print('\nBest: #{} {} ({:.1f}s)'.format(leader, json.dumps(configs[leader]), time.perf_counter() - start_time))
+    if args.out:
+        with open(args.out, 'w') as out_file:
+            json.dump({'bot': bot_file, 'opponent': opponent_file, 'seed': args.seed, 'standings': standings},
+                      out_file, indent=2)
+        print('Wrote', args.out)
+    return standings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Race parameter configurations of one bot against a fixed opponent.')
+    parser.add_argument('--bot', type=str, required=True, help='Bot file to tune')
+    parser.add_argument('--opponent', type=str, default=BOT_2_FILE, help='Fixed opponent bot file')
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=V1,V2',
+                        help='Values of one parameter, JSON or plain strings; repeat to cross several')
+    parser.add_argument('--configs', type=str, default=None, help='JSON file with a list of parameter dicts')
+    parser.add_argument('--matches', type=int, default=1, help='Matches per configuration in the first rung')
+    parser.add_argument('--eta', type=int, default=2, help='Keep 1/eta of the configurations per rung')
+    parser.add_argument('--max-rungs', type=int, default=5, help='Stop after this many rungs')
+    parser.add_argument('--z', type=float, default=2.0, help='Drop configurations this many standard errors behind the leader')
+    parser.add_argument('--mirror', action='store_true', help='Also play every seed with the seats swapped')
+    parser.add_argument('--allin-ev', action='store_true', help='Score all-in hands by their expected value, which cuts variance')
+    parser.add_argument('--seed', type=str, default='sweep', help='Seed for the shared deals')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Matches played in parallel')
+    parser.add_argument('--out', type=str, default=None, help='Write the final standings to this JSON file')
+    run_sweep(parser.parse_args())
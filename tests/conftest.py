@@ -0,0 +1,26 @@
+'''
+Makes the engine scripts and pkbot importable when pytest is run from anywhere, and provides
+a quick pre-flop odds table for tests that score all-ins.
+'''
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import pkbot.evaluator
+
+
+@pytest.fixture(scope='session')
+def small_preflop_table():
+    '''
+    Replaces the pre-flop table with one estimated on 4000 boards (a standard error of about
+    1%), kept in memory, so tests never build or read pkbot/preflop.npy.
+    '''
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(pkbot.evaluator, '_preflop', pkbot.evaluator.build_preflop_table(None, num_boards=4000))
+        patch.setattr(engine, 'ensure_preflop_table', lambda: None)
+        engine.allin_odds.cache_clear()
+        yield
+    engine.allin_odds.cache_clear()
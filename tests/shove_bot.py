@@ -0,0 +1,37 @@
+'''
+A test bot that moves all-in whenever it can raise and never bids, so matches against it
+reach plenty of all-in showdowns.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pkbot.actions import ActionBid, ActionCall, ActionCheck, ActionRaise
+from pkbot.base import BaseBot
+from pkbot.runner import parse_args, run_bot
+
+
+class Player(BaseBot):
+    '''
+    Shoves every street.
+    '''
+
+    def on_hand_start(self, game_info, current_state):
+        pass
+
+    def on_hand_end(self, game_info, current_state):
+        pass
+
+    def get_move(self, game_info, current_state):
+        if current_state.street == 'auction':
+            return ActionBid(0)
+        if current_state.can_act(ActionRaise):
+            return ActionRaise(current_state.raise_bounds[1])
+        if current_state.can_act(ActionCheck):
+            return ActionCheck()
+        return ActionCall()
+
+
+if __name__ == '__main__':
+    run_bot(Player(), parse_args())
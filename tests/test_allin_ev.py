@@ -0,0 +1,71 @@
+'''
+engine.allin_ev against a direct eval7 enumeration of the runouts.
+'''
+from itertools import combinations
+import random
+import eval7
+import pytest
+from engine import GameState, MatchDeck, STARTING_STACK, allin_ev, allin_locked
+from pkbot.cards import card_ids
+from pkbot.evaluator import preflop_odds, showdown_odds
+
+
+def allin_state(seed, street, chips):
+    deck = MatchDeck()
+    deck.rng = random.Random(seed)
+    deck.shuffle()
+    hands = [deck.deal(2), deck.deal(2)]
+    # betting closed on street, so the state has moved on to the next one
+    return GameState(0, street + 1, False, [None, None], [0, 0], chips, hands, [[], []], deck, None)
+
+
+def enumerated_ev(state, street):
+    board = state.deck.peek(street)
+    dead = {str(card) for card in board + state.hands[0] + state.hands[1]}
+    deck = [card for card in eval7.Deck().cards if str(card) not in dead]
+    payoffs = []
+    for runout in combinations(deck, 5 - street):
+        value0 = eval7.evaluate(state.hands[0] + board + list(runout))
+        value1 = eval7.evaluate(state.hands[1] + board + list(runout))
+        if value0 > value1:
+            payoffs.append(STARTING_STACK - state.chips[1])
+        elif value0 < value1:
+            payoffs.append(state.chips[0] - STARTING_STACK)
+        else:
+            payoffs.append((state.chips[0] - state.chips[1]) // 2)
+    return sum(payoffs) / len(payoffs)
+
+
+@pytest.mark.parametrize('street', [3, 4])
+@pytest.mark.parametrize('seed', range(5))
+def test_allin_ev_matches_enumeration(seed, street):
+    state = allin_state(seed, street, [0, 0])
+    assert allin_locked(state)
+    assert allin_ev(state, street) == pytest.approx(enumerated_ev(state, street))
+
+
+def test_allin_ev_uneven_chips():
+    # the auction can leave the players with different stacks behind the same wagers
+    state = allin_state('uneven', 3, [700, 0])
+    assert allin_ev(state, 3) == pytest.approx(enumerated_ev(state, 3))
+
+
+@pytest.mark.parametrize('hands', [(['Ah', 'Ad'], ['Kc', 'Qc']), (['7s', '6s'], ['Ts', '2d']), (['9h', '9c'], ['Jd', 'Th'])])
+def test_preflop_table_close_to_enumeration(small_preflop_table, hands):
+    hand0, hand1 = card_ids(hands[0]), card_ids(hands[1])
+    assert preflop_odds(hand0, hand1) == pytest.approx(showdown_odds(hand0, hand1), abs=0.05)
+
+
+def test_preflop_table_is_suit_and_seat_symmetric(small_preflop_table):
+    win, tie, loss = preflop_odds(card_ids(['Ah', 'Kh']), card_ids(['Qs', 'Js']))
+    assert preflop_odds(card_ids(['Ac', 'Kc']), card_ids(['Qd', 'Jd'])) == (win, tie, loss)
+    assert preflop_odds(card_ids(['Qs', 'Js']), card_ids(['Ah', 'Kh'])) == (loss, tie, win)
+    assert win + tie + loss == pytest.approx(1.)
+    mirror = preflop_odds(card_ids(['Ah', 'Kh']), card_ids(['As', 'Ks']))
+    assert mirror[0] == mirror[2]
+
+
+def test_preflop_allin_uses_the_table(small_preflop_table):
+    state = allin_state('preflop', 0, [0, 0])
+    odds = preflop_odds(card_ids(map(str, state.hands[0])), card_ids(map(str, state.hands[1])))
+    assert allin_ev(state, 0) == pytest.approx((odds[0] - odds[2]) * STARTING_STACK)
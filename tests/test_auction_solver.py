@@ -0,0 +1,38 @@
+'''
+CFR+ in auction_solver converges, and a resumed solve matches an uninterrupted one.
+'''
+import numpy as np
+import pytest
+from auction_solver import BID_FRACTIONS, build_utilities, exploitability, solve_pot
+
+NUM_BUCKETS = 5
+POT = 320
+# a symmetric toy abstraction: a higher bucket wins more often against a lower one
+EQUITY = 0.5 + 0.1 * (np.arange(NUM_BUCKETS)[:, None] - np.arange(NUM_BUCKETS)[None, :])
+JOINT = np.full((NUM_BUCKETS, NUM_BUCKETS), 1. / NUM_BUCKETS ** 2)
+
+
+def solve(iterations, checkpoint_dir=None, checkpoint_every=1000):
+    params = {'toy': True}
+    return solve_pot((POT, BID_FRACTIONS, EQUITY, JOINT, 0.1, iterations, checkpoint_every, checkpoint_dir, params))
+
+
+@pytest.fixture(scope='module')
+def utilities():
+    return build_utilities(POT, BID_FRACTIONS, EQUITY, 0.1)
+
+
+def test_exploitability_decreases(utilities):
+    gaps = [exploitability(utilities, JOINT, [strategy, strategy]) for strategy in map(solve, [10, 100, 1000])]
+    assert gaps[0] > gaps[1] > gaps[2]
+    assert gaps[2] < 0.01  # chips per auction
+
+
+def test_uniform_bids_are_exploitable(utilities):
+    uniform = np.full((NUM_BUCKETS, len(BID_FRACTIONS)), 1. / len(BID_FRACTIONS))
+    assert exploitability(utilities, JOINT, [uniform, uniform]) > exploitability(utilities, JOINT, [solve(1000)] * 2)
+
+
+def test_resumed_solve_matches_uninterrupted(tmp_path):
+    solve(100, str(tmp_path), checkpoint_every=50)
+    assert np.allclose(solve(300, str(tmp_path), checkpoint_every=50), solve(300))
@@ -0,0 +1,55 @@
+'''
+A match stopped mid-way and resumed from its checkpoint plays every round exactly once.
+'''
+import os
+import re
+import pytest
+import engine
+from engine import PokerMatch
+
+BOT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'example_bot.py')
+BOTS = [('BotA', BOT_FILE), ('BotB', BOT_FILE)]
+NUM_ROUNDS = 40
+CRASH_ROUND = 25
+
+
+class CrashingMatch(PokerMatch):
+    '''
+    Raises at the start of CRASH_ROUND, after writing the log of the rounds since the last
+    checkpoint, which the resumed match must drop.
+    '''
+
+    def play_hand(self, players, round_num):
+        if round_num == CRASH_ROUND:
+            self.write_log()
+            raise RuntimeError('simulated crash')
+        super().play_hand(players, round_num)
+
+
+@pytest.fixture
+def short_match(monkeypatch, tmp_path):
+    monkeypatch.setattr(engine, 'NUM_ROUNDS', NUM_ROUNDS)
+    return dict(bots=BOTS, log_folder=str(tmp_path), seed='resume', small_log=True,
+                checkpoint=str(tmp_path / 'match.ckpt'), checkpoint_every=10)
+
+
+def test_resume_plays_every_round_once(short_match):
+    crashed = CrashingMatch(**short_match)
+    with pytest.raises(RuntimeError):
+        crashed.run()
+    for bot in crashed.players:
+        bot.stop()
+    assert os.path.exists(short_match['checkpoint'])
+
+    resumed = PokerMatch(resume=True, **short_match)
+    result = resumed.run()
+    with open(os.path.join(short_match['log_folder'], result['log_file'])) as log_file:
+        log = log_file.read()
+    rounds = [int(num) for num in re.findall(r'^Round #(\d+)', log, re.MULTILINE)]
+    assert rounds == list(range(1, NUM_ROUNDS + 1))
+    assert [hand['round'] for hand in resumed.hand_summaries] == list(range(1, NUM_ROUNDS + 1))
+    # the bankrolls carried over the checkpoint add up to the payoffs of every hand
+    for bot in result['bots']:
+        assert bot['bankroll'] == sum(hand['payoffs'][hand['players'].index(bot['name'])]
+                                      for hand in resumed.hand_summaries)
+    assert not os.path.exists(short_match['checkpoint'])
@@ -0,0 +1,59 @@
+'''
+pkbot.equity showdown matrices against eval7, and the suit-isomorphic cache.
+'''
+import eval7
+import numpy as np
+import pytest
+from pkbot.cards import CARDS, COMBOS, card_ids
+from pkbot.equity import EquityCache, showdown_matrix
+
+EVAL7_CARDS = [eval7.Card(card) for card in CARDS]
+
+
+def eval7_outcome(combo0, combo1, board):
+    value0 = eval7.evaluate([EVAL7_CARDS[card] for card in list(combo0) + board])
+    value1 = eval7.evaluate([EVAL7_CARDS[card] for card in list(combo1) + board])
+    return np.sign(value0 - value1)
+
+
+def sample_pairs(board, num_pairs, seed=0):
+    rng = np.random.default_rng(seed)
+    live = [i for i, combo in enumerate(COMBOS) if not set(combo) & set(board)]
+    pairs = []
+    while len(pairs) < num_pairs:
+        i, j = rng.choice(live, 2, replace=False)
+        if not set(COMBOS[i]) & set(COMBOS[j]):
+            pairs.append((i, j))
+    return pairs
+
+
+def test_river_matrix_matches_eval7():
+    board = card_ids(['Kd', '9d', '4c', '4s', '2d'])
+    matrix = showdown_matrix(board)
+    for i, j in sample_pairs(board, 2000):
+        assert matrix[i, j] == eval7_outcome(COMBOS[i], COMBOS[j], board)
+
+
+def test_turn_matrix_averages_eval7_rivers():
+    board = card_ids(['Jh', 'Th', '5c', '2s'])
+    matrix = showdown_matrix(board)
+    for i, j in sample_pairs(board, 50):
+        rivers = [card for card in range(52) if card not in board + list(COMBOS[i]) + list(COMBOS[j])]
+        expected = np.mean([eval7_outcome(COMBOS[i], COMBOS[j], board + [river]) for river in rivers])
+        assert matrix[i, j] == pytest.approx(expected, abs=1e-6)
+
+
+def test_blocked_pairs_are_zero():
+    board = card_ids(['Ac', '7d', '3h'])
+    matrix = showdown_matrix(board)
+    blocked = [i for i, combo in enumerate(COMBOS) if board[0] in combo]
+    assert not matrix[blocked].any() and not matrix[:, blocked].any()
+
+
+def test_cache_relabels_isomorphic_boards():
+    cache = EquityCache()
+    board = ['Qs', '8s', '3d', '3c']
+    relabeled = ['Qh', '8h', '3s', '3d']  # spades to hearts, diamonds to spades, clubs to diamonds
+    assert np.array_equal(cache.matrix(board), showdown_matrix(card_ids(board)))
+    assert np.array_equal(cache.matrix(relabeled), showdown_matrix(card_ids(relabeled)))
+    assert cache.misses == 1 and cache.hits == 1
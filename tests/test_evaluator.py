@@ -0,0 +1,58 @@
+'''
+pkbot.evaluator must agree with eval7 on every hand.
+'''
+from itertools import combinations
+import eval7
+import numpy as np
+import pytest
+from pkbot.cards import CARDS, card_ids
+from pkbot.evaluator import HandEvaluator, random_hands, showdown_odds
+
+EVAL7_CARDS = [eval7.Card(card) for card in CARDS]
+
+
+def eval7_values(hands):
+    return [eval7.evaluate([EVAL7_CARDS[card] for card in hand]) for hand in hands]
+
+
+@pytest.fixture(scope='module')
+def evaluator(tmp_path_factory):
+    return HandEvaluator(str(tmp_path_factory.mktemp('tables') / 'ranks.npy'))
+
+
+@pytest.mark.parametrize('num_cards', [5, 6, 7])
+def test_random_hands_match_eval7(evaluator, num_cards):
+    hands = random_hands(5000, num_cards, seed=num_cards)
+    assert evaluator.evaluate(hands).tolist() == eval7_values(hands.tolist())
+
+
+def test_flushes_match_eval7(evaluator):
+    # random hands rarely hold a flush, so deal five or more cards of one suit
+    rng = np.random.default_rng(0)
+    hands = []
+    for _ in range(2000):
+        suited = (4 * rng.choice(13, rng.integers(5, 8), replace=False) + rng.integers(4)).tolist()
+        others = rng.permutation([card for card in range(52) if card not in suited])
+        hands.append(suited + others[:7 - len(suited)].tolist())
+    assert evaluator.evaluate(hands).tolist() == eval7_values(hands)
+
+
+def test_showdown_odds_match_eval7_on_the_turn():
+    hand0, hand1, board = card_ids(['Ah', 'Kh']), card_ids(['Qs', 'Qd']), card_ids(['2h', '7h', 'Qc', '3s'])
+    wins = ties = 0
+    rivers = [card for card in range(52) if card not in hand0 + hand1 + board]
+    for river in rivers:
+        value0, value1 = eval7_values([hand0 + board + [river], hand1 + board + [river]])
+        wins += value0 > value1
+        ties += value0 == value1
+    expected = (wins / len(rivers), ties / len(rivers), (len(rivers) - wins - ties) / len(rivers))
+    assert showdown_odds(hand0, hand1, board) == pytest.approx(expected)
+
+
+def test_showdown_odds_match_eval7_on_the_flop():
+    hand0, hand1, board = card_ids(['9c', '9d']), card_ids(['As', '8s']), card_ids(['8h', '4s', 'Ts'])
+    deck = [card for card in range(52) if card not in hand0 + hand1 + board]
+    outcomes = [np.sign(np.subtract(*eval7_values([hand0 + board + list(runout), hand1 + board + list(runout)])))
+                for runout in combinations(deck, 2)]
+    expected = tuple(outcomes.count(outcome) / len(outcomes) for outcome in (1, 0, -1))
+    assert showdown_odds(hand0, hand1, board) == pytest.approx(expected)
@@ -0,0 +1,125 @@
+'''
+pkbot.range.Range updates, on their own and as the Runner applies them during a match.
+'''
+import socket
+from threading import Thread
+import numpy as np
+import pytest
+import engine
+from engine import BotProcess, PokerMatch
+from example_bot import Player as ExamplePlayer
+from pkbot.actions import ActionBid
+from pkbot.cards import COMBOS, COMBO_MASK, NUM_COMBOS, card_ids, card_mask
+from pkbot.range import Range
+from pkbot.runner import Runner
+
+COMBO_BITS = np.array(COMBO_MASK, dtype=np.uint64)
+
+
+def containing(cards):
+    '''
+    Returns a boolean vector of the combos holding any of the cards.
+    '''
+    return (COMBO_BITS & np.uint64(card_mask(cards))) != 0
+
+
+def test_block_zeroes_combos_with_the_cards():
+    opp_range = Range()
+    opp_range.block(['As', 'Kd', '7c'])
+    assert not opp_range.weights[containing(['As', 'Kd', '7c'])].any()
+    assert opp_range.total() == 49 * 48 / 2
+
+
+def test_reveal_keeps_combos_with_the_card():
+    opp_range = Range()
+    opp_range.block(['2c', '3c'])
+    opp_range.reveal(['Qh'])
+    kept = [COMBOS[i] for i in np.flatnonzero(opp_range.weights)]
+    assert len(kept) == 49 and all(card_ids(['Qh'])[0] in combo for combo in kept)
+
+
+def test_update_reset_and_normalized():
+    prior = np.arange(NUM_COMBOS, dtype=np.float64)
+    opp_range = Range(prior)
+    likelihood = np.linspace(0., 1., NUM_COMBOS)
+    opp_range.update(likelihood)
+    opp_range.update(likelihood)
+    assert np.allclose(opp_range.weights, prior * likelihood ** 2)
+    assert opp_range.normalized().sum() == pytest.approx(1.)
+    opp_range.reset()
+    assert np.array_equal(opp_range.weights, prior)
+    opp_range.block(['Ac'])
+    opp_range.reveal(['Ad', 'Ac'])  # impossible: every combo with Ac is blocked
+    assert not opp_range.normalized().any()
+
+
+class InProcessBot(BotProcess):
+    '''
+    Serves a pokerbot from a Runner thread in this process, over a socket pair.
+    '''
+
+    def __init__(self, name, pokerbot, log_folder):
+        super().__init__(name, name, log_folder)
+        self.pokerbot = pokerbot
+
+    def run(self):
+        engine_end, bot_end = socket.socketpair()
+        engine_end.settimeout(10.)  # a failing bot thread times out instead of hanging the match
+        self.socketfile = engine_end.makefile('rw')
+        Thread(target=Runner(self.pokerbot, bot_end.makefile('rw')).run, daemon=True).start()
+
+
+class RangeChecker(ExamplePlayer):
+    '''
+    Plays like the example bot while checking its Range before every decision. Every opponent
+    action halves every weight, so the live weights must all be 0.5 ** (actions seen).
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.opp_range = Range()
+        self.observed = 0
+        self.bid_observed = False
+        self.decisions = 0
+        self.reveals = 0
+        self.errors = []
+
+    def on_hand_start(self, game_info, current_state):
+        self.observed = 0
+        self.bid_observed = False
+
+    def opp_action_likelihood(self, game_info, current_state, action):
+        self.observed += 1
+        self.bid_observed |= isinstance(action, ActionBid)
+        return np.full(NUM_COMBOS, 0.5)
+
+    def get_move(self, game_info, current_state):
+        self.decisions += 1
+        round_num = game_info.round_num
+        weights = self.opp_range.weights
+        if weights[containing(current_state.my_hand + current_state.board)].any():
+            self.errors.append((round_num, 'blocked combos kept weight'))
+        if current_state.opp_revealed_cards:
+            self.reveals += 1
+            if weights[~containing(current_state.opp_revealed_cards[:1])].any():
+                self.errors.append((round_num, 'combos without the revealed card kept weight'))
+        if not np.allclose(weights[weights > 0], 0.5 ** self.observed):
+            self.errors.append((round_num, 'weights do not match the {} opponent actions'.format(self.observed)))
+        if current_state.street == 'auction' and self.bid_observed:
+            self.errors.append((round_num, 'opponent bid observed before our own'))
+        return super().get_move(game_info, current_state)
+
+
+def test_runner_keeps_the_range_updated(monkeypatch, tmp_path):
+    monkeypatch.setattr(engine, 'NUM_ROUNDS', 200)
+    checker = RangeChecker()
+    processes = [InProcessBot('Checker', checker, str(tmp_path)), InProcessBot('Example', ExamplePlayer(), str(tmp_path))]
+    for process in processes:
+        process.run()
+    result = PokerMatch(bots=[(process.name, process.file_path) for process in processes], log_folder=str(tmp_path),
+                        processes=processes, table=0, small_log=True).run()
+    for process in processes:
+        process.stop()
+    assert all(bot['timeouts'] == 0 and bot['illegal_actions'] == 0 for bot in result['bots'])
+    assert checker.decisions > 200 and checker.reveals > 0
+    assert checker.errors == []
@@ -0,0 +1,36 @@
+'''
+What the engine writes to the results database matches what parse_game_log reads back from
+the game log of the same match.
+'''
+import os
+import pytest
+import engine
+import results_db
+from engine import PokerMatch
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+BOTS = [('Example', os.path.join(os.path.dirname(TESTS), 'example_bot.py')), ('Shove', os.path.join(TESTS, 'shove_bot.py'))]
+MATCH_QUERY = 'SELECT started, log_file, bot_a, bot_b, bankroll_a, bankroll_b, num_hands FROM matches'
+HAND_QUERY = 'SELECT round, street_reached, showdown, auction_winner, pot FROM hands ORDER BY round'
+PLAYER_QUERY = 'SELECT round, bot, opponent, is_bb, payoff, bid, ev_payoff FROM hand_players ORDER BY round, is_bb'
+
+
+@pytest.mark.parametrize('small_log', [False, True])
+def test_database_matches_game_log(small_preflop_table, monkeypatch, tmp_path, small_log):
+    monkeypatch.setattr(engine, 'NUM_ROUNDS', 200)
+    db_path = str(tmp_path / 'engine.db')
+    result = PokerMatch(bots=BOTS, log_folder=str(tmp_path), db_path=db_path,
+                        small_log=small_log, allin_ev=True, seed='db').run()
+    match, hands = results_db.parse_game_log(os.path.join(str(tmp_path), result['log_file']))
+    parsed = results_db.connect(':memory:')
+    results_db.record_match(parsed, match, hands)
+    written = results_db.connect(db_path)
+
+    for query in (MATCH_QUERY, HAND_QUERY):
+        assert written.execute(query).fetchall() == parsed.execute(query).fetchall()
+    written_players = written.execute(PLAYER_QUERY).fetchall()
+    parsed_players = parsed.execute(PLAYER_QUERY).fetchall()
+    assert [row[:-1] for row in written_players] == [row[:-1] for row in parsed_players]
+    # the log rounds EV payoffs to one decimal
+    assert [row[-1] for row in written_players] == pytest.approx([row[-1] for row in parsed_players], abs=0.051)
+    assert any(row[-1] != row[4] for row in written_players)  # some hand was scored by its all-in EV
@@ -0,0 +1,132 @@
+'''
+Chrome trace-event recorder for the engine's match timeline.
+
+The output loads in chrome://tracing or https://ui.perfetto.dev (which runs locally in the
+browser). Only every n-th hand is recorded so long matches stay small.
+'''
+import json
+import os
+import time
+
+
+class _NullSpan():
+    '''
+    Span returned while tracing is off; entering and leaving it does nothing.
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span():
+    '''
+    Records one complete ('X') event when it exits.
+    '''
+
+    __slots__ = ('tracer', 'name', 'tid', 'args', 'start')
+
+    def __init__(self, tracer, name, tid, args):
+        self.tracer = tracer
+        self.name = name
+        self.tid = tid
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        tracer = self.tracer
+        tracer.events.append({
+            'name': self.name, 'ph': 'X', 'pid': tracer.pid, 'tid': self.tid,
+            'ts': (self.start - tracer.origin) / 1000., 'dur': (end - self.start) / 1000.,
+            'args': dict(tracer.context, **self.args),
+        })
+        return False
+
+
+class Tracer():
+    '''
+    Collects spans for sampled hands and writes them as trace-event JSON.
+
+    Thread ids name the rows of the timeline: 0 is the engine, and each bot gets its own row
+    for the time spent waiting on its response.
+    '''
+
+    def __init__(self, path, sample_every=1):
+        self.path = path
+        self.sample_every = max(1, sample_every)
+        self.pid = os.getpid()
+        self.origin = time.perf_counter_ns()
+        self.events = []
+        self.context = {}
+        self.active = True
+        self.thread_names = {0: 'engine'}
+
+    def name_thread(self, tid, name):
+        '''
+        Labels a row of the timeline.
+        '''
+        self.thread_names[tid] = name
+
+    def start_hand(self, round_num):
+        '''
+        Decides whether the hand is sampled and tags its spans with the round number.
+        '''
+        self.active = (round_num - 1) % self.sample_every == 0
+        self.context = {'round': round_num}
+
+    def set_street(self, street):
+        '''
+        Tags the following spans with the current street.
+        '''
+        self.context = dict(self.context, street=street)
+
+    def span(self, name, tid=0, always=False, **args):
+        '''
+        Returns a context manager timing a span; a no-op outside sampled hands unless always.
+        '''
+        if not (self.active or always):
+            return NULL_SPAN
+        return _Span(self, name, tid, args)
+
+    def write(self):
+        '''
+        Writes the collected events to the trace file.
+        '''
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                    for tid, name in self.thread_names.items()]
+        with open(self.path, 'w') as trace_file:
+            json.dump({'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}, trace_file)
+        print('Wrote trace with {} events to {}'.format(len(self.events), self.path))
+
+
+class NullTracer():
+    '''
+    Tracer used when tracing is disabled.
+    '''
+
+    def name_thread(self, tid, name):
+        pass
+
+    def start_hand(self, round_num):
+        pass
+
+    def set_street(self, street):
+        pass
+
+    def span(self, name, tid=0, always=False, **args):
+        return NULL_SPAN
+
+    def write(self):
+        pass
+
+
+NULL_TRACER = NullTracer()